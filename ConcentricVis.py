@@ -1,4 +1,5 @@
 import bitmaptools
+import displayio
 from random import randrange
 import math
 from hsv565 import HSV565
@@ -8,6 +9,8 @@ num_master_rings = 3
 num_rings = 5
 ring_spacing = 9
 
+wave_size = 20 # How far (in pixels) the centers swing away from the middle of the vis
+
 class CCircle:
     """ Represents a concentric circle """
     x = 0
@@ -17,6 +20,8 @@ class CCircle:
     ang_y = 0
     speed_x = 0
     speed_y = 0
+    rings = None # Pre-rasterized rings for this master (see ConcentricVis.build_rings)
+    rings_radius = 0 # Offset from the top left of the rings bitmap to the ring center
 
     def move( self, delta ):
         #increment the angles
@@ -33,13 +38,31 @@ class CCircle:
         # we will apply these wave values in our draw function
 
     def draw( self, bitmap ):
-        for i in range(0,num_rings):
-            size = int(ring_spacing + i*ring_spacing)
-            bitmaptools.draw_circle(bitmap,
-                                    int(self.x + math.sin(self.ang_x) * 20),
-                                    int(self.y + math.sin(self.ang_y) * 20),
-                                    size, 
-                                    self.color)
+        # All the rings are already drawn in our cached bitmap, so all we need to do
+        # is copy it to the new center, clipped to the edges of the target bitmap
+        rings = self.rings
+        x = int(self.x + math.sin(self.ang_x) * wave_size) - self.rings_radius
+        y = int(self.y + math.sin(self.ang_y) * wave_size) - self.rings_radius
+        x1 = 0
+        y1 = 0
+        x2 = rings.width
+        y2 = rings.height
+        if x < 0:
+            x1 = -x
+            x = 0
+        if y < 0:
+            y1 = -y
+            y = 0
+        if x + x2 - x1 > bitmap.width:
+            x2 = x1 + bitmap.width - x
+        if y + y2 - y1 > bitmap.height:
+            y2 = y1 + bitmap.height - y
+        if x2 <= x1 or y2 <= y1: # completely off screen
+            return
+        bitmaptools.blit(bitmap, rings, x, y,
+                         x1=x1, y1=y1, x2=x2, y2=y2,
+                         skip_source_index=0)
+
 class ConcentricVis:
     hsv = HSV565()
 
@@ -57,7 +80,32 @@ class ConcentricVis:
 
     all_cc = []
 
+    def build_rings( self, color ):
+        """ Rasterize all the rings of a master once, so drawing is just a blit """
+        # Rings bigger than the distance from the furthest possible center to the
+        # furthest corner can never be seen, so don't waste memory on them
+        max_dx = self.visWidthHalf + wave_size
+        max_dy = self.visHeighthalf + wave_size
+        max_visible = int(math.sqrt(max_dx*max_dx + max_dy*max_dy)) + 1
+
+        radius = 0
+        for i in range(0,num_rings):
+            size = int(ring_spacing + i*ring_spacing)
+            if size <= max_visible and size > radius:
+                radius = size
+
+        # Index 0 stays empty (transparent when blitting), so avoid a pure black ring
+        if color == 0:
+            color = 1
+        rings = displayio.Bitmap(radius*2+1, radius*2+1, 65535)
+        for i in range(0,num_rings):
+            size = int(ring_spacing + i*ring_spacing)
+            if size <= radius:
+                bitmaptools.draw_circle(rings, radius, radius, size, color)
+        return rings, radius
+
     def reset( self ):
+        self.all_cc = []
         hstep = 360//num_master_rings
         hue_start = randrange(0,359)
         for i in range(num_master_rings):
@@ -66,6 +114,7 @@ class ConcentricVis:
             a_shape.x = self.visWidthHalf
             a_shape.y = self.visHeighthalf
             a_shape.color = self.hsv.hsv2rgb565((hue_start+i*hstep)%360,1,1)
+            a_shape.rings, a_shape.rings_radius = self.build_rings(a_shape.color)
             a_shape.ang_x = i*2.3
             a_shape.ang_y = i*3.4
             a_shape.speed_x = 4.3
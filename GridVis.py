@@ -15,6 +15,20 @@ class GridLayer:
     speed_x = 0
     speed_y = 0
 
+    line_offsets = () # Line positions relative to the layer offset (one per line)
+    cols = () # Current x positions of the vertical lines
+    rows = () # Current y positions of the horizontal lines
+    int_x = -1 # Integer offsets the rows/cols were last built for
+    int_y = -1
+
+    def set_spacing( self, spacing ):
+        # Line positions only depend on the spacing, so work them out once
+        self.grid_spacing = spacing
+        num_lines = 64//spacing
+        self.line_offsets = tuple(int(off*spacing) for off in range(int(num_lines)))
+        self.int_x = -1
+        self.int_y = -1
+
     def move( self, delta, accel ):
         #increment the position
         self.x += self.speed_x * accel[0] * 0.3 * delta
@@ -24,25 +38,29 @@ class GridLayer:
         self.x = self.x%64
         self.y = self.y%64
 
+    def update_lines( self ):
+        """ Rebuild the row/column positions if the integer offset moved, returns True if it did """
+        ix = int(self.x)
+        iy = int(self.y)
+        if ix == self.int_x and iy == self.int_y:
+            return False
+        if ix != self.int_x:
+            self.cols = tuple((ix + off)%64 for off in self.line_offsets)
+            self.int_x = ix
+        if iy != self.int_y:
+            self.rows = tuple((iy + off)%64 for off in self.line_offsets)
+            self.int_y = iy
+        return True
+
     def draw( self, bitmap ):
-        # draw vertical and horizontal lines with grid_spacing
-        # with offset on the x & y
+        # Every line is a full length horizontal or vertical span, so
+        # fill a 1 pixel wide region rather than using the general line drawing
+        color = self.color
+        for x in self.cols:
+            bitmaptools.fill_region(bitmap, x, 0, x+1, 64, color)
+        for y in self.rows:
+            bitmaptools.fill_region(bitmap, 0, y, 64, y+1, color)
 
-        # Draw lines
-        num_lines = 64//self.grid_spacing
-        for off in range(num_lines):
-            bitmaptools.draw_line(bitmap,
-                                  int((self.x + off*self.grid_spacing))%64,
-                                  0,
-                                  int((self.x + off*self.grid_spacing))%64,
-                                  63,
-                                  self.color)
-            bitmaptools.draw_line(bitmap,
-                                  0,
-                                  int((self.y + off*self.grid_spacing))%64,
-                                  63,
-                                  int((self.y + off*self.grid_spacing))%64,
-                                  self.color)
 class GridVis:
     hsv = HSV565()
 
@@ -56,7 +74,7 @@ class GridVis:
         self.visHeight = HEIGHT
         self.visWidthHalf = WIDTH//2
         self.visHeighthalf = HEIGHT//2
-        print( f"ConcentricVis initialized - Width {WIDTH}, Height {HEIGHT}")
+        print( f"GridVis initialized - Width {WIDTH}, Height {HEIGHT}")
 
     all_grids = []
 
@@ -67,7 +85,7 @@ class GridVis:
 #         print( f"grid resetting, new hue index is {hue_start}")
         for i in range(num_grids):
             a_grid = GridLayer()
-            a_grid.grid_spacing = 10+i*5.5
+            a_grid.set_spacing(10+i*5.5)
             a_grid.x = self.visWidthHalf
             a_grid.y = self.visHeighthalf
             a_grid.color = self.hsv.hsv2rgb565((hue_start+i*1)%360,
@@ -83,6 +101,10 @@ class GridVis:
         
         for i in range(num_grids):
             self.all_grids[i].move(delta, accel)
+            self.all_grids[i].update_lines()
     
+        # Layers are drawn back to front straight into the target: all their
+        # spans come to about a quarter of the pixels a cached copy of them
+        # would take to clear and blit each frame
         for i in range(num_grids):
             self.all_grids[i].draw(bitmap)
@@ -1,37 +1,46 @@
 # Board related imports
 import board # Infor about the board
-import terminalio
 import rgbmatrix # For controlling the RGB LED Panel
 import framebufferio
-import adafruit_lis3dh # Accelerometer
-import busio
 import digitalio
-import usb_cdc
 
 # Graphic imports
 import adafruit_imageload
 import displayio # General drawing tools
 import bitmaptools # Faster drawing to bitmap helpers
-from adafruit_display_text import label, outlined_label # Efficient text on bitmaps
-from adafruit_bitmap_font import bitmap_font # Custom bitmap fonts (from FontForge BDF files)
 
 # General imports
 import math # general math helpers (sin/cos/etc)
-from random import randrange # random numbers
 import os
+import gc
+from telemetry import Telemetry # Heap/GC stats for each stage of the main loop
 
 # Time related imports
 import supervisor
+from adafruit_ticks import ticks_add, ticks_diff # ticks_ms() wraps (the first time about a minute after reset)
 import time
-import adafruit_datetime
 import rtc
 
-# WiFi imports
-import ipaddress
-import ssl
-import wifi
-import socketpool
-import adafruit_requests
+# Everything else (the color pipeline, text, fonts, WiFi, web requests and the
+# tracking, sprites and zoom modules) is imported by the boot stages in main()
+# once the map is on the panel - see the import_*_modules() functions
+ColorPipeline = None # colorpipe - gamma LUT and temporal dithering for low bit depths
+label = None
+bitmap_font = None
+adafruit_datetime = None
+ssl = None
+wifi = None
+socketpool = None
+adafruit_requests = None
+Endpoint = None # fetch - backoff and circuit breaker for the web APIs
+FetchError = None
+satellites = None # Tracked objects and the providers that position them
+SpriteSheet = None # sprites - markers as sprites
+Sprite = None
+PaletteBlink = None
+rgb565_to_888 = None
+TileCache = None # tiles - zoomed in map that follows the ISS
+TileMap = None
 
 # Settings
 DEBUG = True
@@ -39,12 +48,139 @@ WIDTH = 64
 HEIGHT = 64
 WIFI_CHECK_INTERVAL_SEC = 120
 ISS_UPDATE_INTERVAL_SEC = 60
+ORBIT_UPDATE_INTERVAL_SEC = 10 # For objects positioned from their TLE (no network needed)
 TIME_UPDATE_INTERVAL_SEC = 3600
 AUTO_REFRESH = False
+BIT_DEPTH = 4 # Matrix bit depth - lower refreshes faster and leaves more CPU for us, dithering makes up the shades
+GAMMA = 2.2 # Gamma correction for the map and markers (1.0 turns it off)
+DOUBLEBUFFER = True # Flicker-free refresh (affordable at lower bit depths)
+RECORD_SCENARIO = None # e.g. "/sd/scenario.jsonl" to record every web request for tools/replay.py (needs a writable filesystem)
+
+# Interval settings in ms, so the main loop doesn't have to work them out every frame
+WIFI_CHECK_INTERVAL_MS = WIFI_CHECK_INTERVAL_SEC * 1000
+ISS_UPDATE_INTERVAL_MS = ISS_UPDATE_INTERVAL_SEC * 1000
+ORBIT_UPDATE_INTERVAL_MS = ORBIT_UPDATE_INTERVAL_SEC * 1000
+TIME_UPDATE_INTERVAL_MS = TIME_UPDATE_INTERVAL_SEC * 1000
+REPORT_INTERVAL_MS = 1000
+
+# Push mode (MQTT) - turned on by setting MQTT_BROKER in settings.toml
+PUSH_POLL_INTERVAL_MS = 250 # How often to check for pushed messages
+PUSH_RETRY_INTERVAL_MS = 30 * 1000 # How soon to retry the broker while falling back to polling (backs off from there)
+
+# Main loop stages (for telemetry)
+STAGE_WIFI = 0
+STAGE_PUSH = 1
+STAGE_TRACK = 2
+STAGE_TIME = 3
+STAGE_DRAW = 4
+STAGE_REFRESH = 5
+STAGE_REPORT = 6
+STAGE_NAMES = ("wifi", "push", "track", "time", "draw", "refresh", "report")
+
+# Cached "00" to "59" strings for the clock
+TWO_DIGITS = tuple("%02d" % i for i in range(60))
+
+# Objects to show on the map (name, NORAD catalog number, update interval, marker style, colors)
+# The ISS comes from open-notify, everything else is propagated from its TLE
+# Marker styles are by name (see satellites.MARKER_NAMES) as satellites isn't imported yet
+ISS_NORAD_ID = 25544
+TRACKED_OBJECTS = (
+    ("ISS", ISS_NORAD_ID, ISS_UPDATE_INTERVAL_MS, "cross", 0xF800, 0x0800),
+    ("Tiangong", 48274, ORBIT_UPDATE_INTERVAL_MS, "cross", 0xFFE0, 0x0840),
+    ("Hubble", 20580, ORBIT_UPDATE_INTERVAL_MS, "dot", 0x07FF, 0x0000),
+)
+# More objects can be added with TRACKED_NORAD_IDS = "12345,67890" in settings.toml
+USER_OBJECT_COLOR = 0xFFFF
+
+# Sprites for the markers (False draws them into the bitmap every frame instead)
+SPRITES = True
+# Palette index digits ("." is transparent) - 3 is the solar panels, 2 the body, d the blinking light
+ISS_ICON = (("33.2.33",
+             "332d233",
+             "33.2.33"),)
+ISS_LIGHT_INDEX = 13
+ISS_LIGHT_COLORS = (0xff0000, 0x400000)
+ISS_LIGHT_BLINK_MS = 500
+# Other markers, one tile per marker style (1 is the object's color, 2 its outline color)
+MARKER_TILES = (("...",
+                 ".1.",
+                 "..."),  # satellites.MARKER_DOT
+                (".2.",
+                 "212",
+                 ".2."),  # satellites.MARKER_CROSS
+                ("222",
+                 "212",
+                 "222"))  # satellites.MARKER_BOX
+
+# Zoom mode (up/down buttons) - tiles made by tools/make_tiles.py
+TILE_ROOT = "/sd/tiles"
+TILE_SIZE = 32
+TILE_CACHE_SIZE = 16 # Tiles kept in memory (a 64x64 view needs up to 9, plus a row, column and corner to load ahead)
+MAX_ZOOM = 3
+FOLLOW_NORAD_ID = ISS_NORAD_ID # The object the zoomed in view stays centered on
+
+# Local time zone offset from UTC in seconds (from timeapi.io), None until we've asked
+utc_offset_sec = None
+
+# Backoff/circuit breaker state for each thing we connect to (see fetch.py and make_endpoints())
+wifi_endpoint = None
+iss_endpoint = None
+time_endpoint = None
+tle_endpoint = None
 
 ################################################################################
 # Functions
 
+boot_timeline = [] # (stage name, ms since reset) for each boot stage
+
+def boot_stage(name):
+    """Record (and print) how long after reset a boot stage finished"""
+    ms = time.monotonic_ns() // 1000000
+    boot_timeline.append((name, ms))
+    debug_print(f"Boot: {name} at {ms} ms")
+
+def import_color_modules():
+    """Import the gamma/dither pipeline (deferred until the map is on the panel)"""
+    global ColorPipeline
+    from colorpipe import ColorPipeline
+
+def import_text_modules():
+    """Import the text/font modules (deferred until the map is on the panel)"""
+    global label, bitmap_font
+    from adafruit_display_text import label # Efficient text on bitmaps
+    from adafruit_bitmap_font import bitmap_font # Custom bitmap fonts (from FontForge BDF files)
+
+def import_network_modules():
+    """Import the WiFi and web request modules (deferred until the map is on the panel)"""
+    global adafruit_datetime, ssl, wifi, socketpool, adafruit_requests, Endpoint, FetchError
+    import adafruit_datetime
+    import ssl
+    import wifi
+    import socketpool
+    import adafruit_requests
+    from fetch import Endpoint, FetchError
+
+def import_tracking_modules():
+    """Import the tracking, sprite and zoom modules (deferred until the clock is showing)"""
+    global satellites, SpriteSheet, Sprite, PaletteBlink, rgb565_to_888, TileCache, TileMap
+    import satellites
+    from sprites import SpriteSheet, Sprite, PaletteBlink, rgb565_to_888
+    from tiles import TileCache, TileMap
+
+def make_endpoints():
+    """Set up the backoff/circuit breaker state for each thing we connect to"""
+    global wifi_endpoint, iss_endpoint, time_endpoint, tle_endpoint, push_endpoint
+    wifi_endpoint = Endpoint("wifi", supervisor.ticks_ms, base_backoff_ms=5000, max_backoff_ms=120000,
+                             output=debug_print)
+    # The APIs are skipped while WiFi is down, so they're not left backing off when it comes back
+    iss_endpoint = Endpoint("open-notify", supervisor.ticks_ms, output=debug_print, online=is_wifi_connected)
+    time_endpoint = Endpoint("timeapi.io", supervisor.ticks_ms, output=debug_print, online=is_wifi_connected)
+    tle_endpoint = Endpoint("celestrak", supervisor.ticks_ms, output=debug_print, online=is_wifi_connected)
+    # A broker retry only costs PushClient.retry_timeout, so it's not left backing off for long
+    push_endpoint = Endpoint("mqtt", supervisor.ticks_ms, base_backoff_ms=PUSH_RETRY_INTERVAL_MS,
+                             max_backoff_ms=4 * PUSH_RETRY_INTERVAL_MS, open_ms=PUSH_RETRY_INTERVAL_MS,
+                             output=debug_print, online=is_wifi_connected)
+
 def debug_print(*args, **kwargs):
     """Prevent printing when serial is disconnected"""
     if DEBUG:
@@ -60,45 +196,141 @@ def is_wifi_connected():
     except Exception:
         return False
 
-def reconnect_wifi(max_retries=3, delay=5):
-    """Attempt to reconnect to Wi-Fi if disconnected."""
-    for attempt in range(1, max_retries + 1):
-        try:
-            debug_print(f"Reconnecting Wi-Fi (attempt {attempt})...")
-            wifi.radio.connect(os.getenv("CIRCUITPY_WIFI_SSID"), os.getenv("CIRCUITPY_WIFI_PASSWORD"))
-            debug_print("Reconnected:", wifi.radio.ipv4_address)
-            return True
-        except Exception as e:
-            debug_print("Reconnect failed:", e)
-            time.sleep(delay)
-    debug_print("Failed to reconnect after multiple attempts.")
-    return False
+def reconnect_wifi():
+    """Attempt to reconnect to Wi-Fi (once, backing off between attempts). Returns True if connected."""
+    def connect():
+        debug_print("Reconnecting Wi-Fi...")
+        wifi.radio.connect(os.getenv("CIRCUITPY_WIFI_SSID"), os.getenv("CIRCUITPY_WIFI_PASSWORD"))
+        debug_print("Reconnected:", wifi.radio.ipv4_address)
+        return True
+    return wifi_endpoint.call(connect) is not None
+
+def reconnect_push(push, timeout):
+    """Attempt to (re)connect to the MQTT broker (once, backing off between attempts). Returns True if connected."""
+    def connect():
+        if not push.connect(timeout):
+            raise FetchError("broker unreachable")
+        return True
+    return push_endpoint.call(connect) is not None
 
 def get_iss_position(requests):
     """
     Fetch the current ISS position from the API
-    Returns: (latitude, longitude) tuple or None if failed
+    Returns: (latitude, longitude) tuple, the last known position if the API is
+    failing, or None if we've never had one
     """
     url = "http://api.open-notify.org/iss-now.json"
 
-    for attempt in range(3):  # retry up to 3 times
+    def fetch():
+        response = requests.get(url, timeout=5)
         try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                lat = float(data['iss_position']['latitude'])
-                lon = float(data['iss_position']['longitude'])
-                debug_print(f"ISS Position: Lat {lat}, Lon {lon}")
-                response.close()
-                return (lat, lon)
-            else:
-                debug_print(f"ISS API returned status code: {response.status_code}")
-        except Exception as e:
-            debug_print(f"Error fetching ISS position (attempt {attempt + 1}): {e}")
-            if not is_wifi_connected():
-                reconnect_wifi()
-            time.sleep(2)
-    return None
+            if response.status_code != 200:
+                raise FetchError(f"ISS API returned status code: {response.status_code}")
+            data = response.json()
+            lat = float(data['iss_position']['latitude'])
+            lon = float(data['iss_position']['longitude'])
+        finally:
+            response.close()
+        debug_print(f"ISS Position: Lat {lat}, Lon {lon}")
+        return (lat, lon)
+
+    position = iss_endpoint.call(fetch)
+    return position if position is not None else iss_endpoint.last_value
+
+def get_tle(requests, norad_id):
+    """
+    Fetch the current two line elements for a satellite from CelesTrak
+    Returns: (line1, line2) tuple, () if CelesTrak has no TLE for it, or None if failed
+    """
+    url = f"https://celestrak.org/NORAD/elements/gp.php?CATNR={norad_id}&FORMAT=TLE"
+
+    def fetch():
+        response = requests.get(url, timeout=5)
+        try:
+            if response.status_code != 200:
+                raise FetchError(f"TLE API returned status code: {response.status_code}")
+            lines = response.text.splitlines()
+        finally:
+            response.close()
+        # Name line, then the two element lines
+        if len(lines) >= 3 and lines[1].startswith("1 ") and lines[2].startswith("2 "):
+            debug_print(f"Got TLE for {norad_id}")
+            return (lines[1], lines[2])
+        # CelesTrak answered, it just doesn't know the object, so that's not the endpoint failing
+        debug_print(f"No TLE for {norad_id}")
+        return ()
+
+    return tle_endpoint.call(fetch)
+
+def utc_now():
+    """Current unix time (UTC), or None if we haven't got the time zone offset yet"""
+    if utc_offset_sec is None:
+        return None
+    return time.time() - utc_offset_sec
+
+def make_tracker(requests, color_pipeline):
+    """Set up the tracked object list (from TRACKED_OBJECTS and settings.toml) and their providers"""
+    tracker = satellites.Tracker(latlon_to_pixel)
+    open_notify = satellites.OpenNotifyProvider(lambda: get_iss_position(requests))
+    tle = satellites.TLEProvider(lambda norad_id: get_tle(requests, norad_id), utc_now, debug_print)
+
+    objects = list(TRACKED_OBJECTS)
+    user_ids = os.getenv("TRACKED_NORAD_IDS")
+    if user_ids:
+        for norad_id in str(user_ids).split(","):
+            try:
+                norad_id = int(norad_id)
+            except ValueError:
+                debug_print(f"Ignoring bad NORAD ID: {norad_id}")
+                continue
+            objects.append((str(norad_id), norad_id, ORBIT_UPDATE_INTERVAL_MS,
+                            "dot", USER_OBJECT_COLOR, 0))
+
+    for name, norad_id, interval, marker, color, outline_color in objects:
+        obj = satellites.TrackedObject(name, norad_id, interval, satellites.MARKER_NAMES.index(marker),
+                                       color_pipeline.correct565(color),
+                                       color_pipeline.correct565(outline_color))
+        tracker.add(obj, open_notify if norad_id == ISS_NORAD_ID else tle)
+    return tracker
+
+def set_time_from_unix(local_rtc, unix_utc, offset):
+    """Set the RTC to local time from a unix timestamp and UTC offset (e.g. pushed over MQTT)"""
+    global utc_offset_sec
+    local_rtc.datetime = time.localtime(unix_utc + offset)
+    utc_offset_sec = offset
+
+def make_push_client(pool, tracker, local_rtc):
+    """Set up push mode if MQTT_BROKER is in settings.toml, returns None if it isn't"""
+    broker = os.getenv("MQTT_BROKER")
+    if not broker:
+        return None
+    from push import PushClient
+    return PushClient(pool, ssl.create_default_context(),
+                      broker, os.getenv("MQTT_PORT") or 1883,
+                      os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD"),
+                      os.getenv("MQTT_TOPIC_PREFIX") or "isstracker",
+                      lambda norad_id, lat, lon: tracker.set_position(norad_id, lat, lon, supervisor.ticks_ms()),
+                      lambda unix_utc, offset: set_time_from_unix(local_rtc, unix_utc, offset),
+                      utc_now, debug_print)
+
+def make_sprites(tracker, sprite_group, palette):
+    """Give every tracked object a sprite (the ISS gets its icon), returns the ISS light blinker"""
+    iss_sheet = SpriteSheet.from_rows(ISS_ICON, palette)
+    marker_sheet = None
+    for obj in tracker.objects:
+        if obj.norad_id == ISS_NORAD_ID:
+            obj.sprite = Sprite(iss_sheet)
+        else:
+            # Markers share one sheet, but each gets a tiny palette with its own colors
+            marker_palette = displayio.Palette(3)
+            marker_palette[1] = rgb565_to_888(obj.color)
+            marker_palette[2] = rgb565_to_888(obj.outline_color)
+            marker_palette.make_transparent(0)
+            if marker_sheet is None:
+                marker_sheet = SpriteSheet.from_rows(MARKER_TILES, marker_palette)
+            obj.sprite = Sprite(marker_sheet, obj.marker, palette=marker_palette)
+        sprite_group.append(obj.sprite.tilegrid)
+    return PaletteBlink(palette, ISS_LIGHT_INDEX, ISS_LIGHT_COLORS, ISS_LIGHT_BLINK_MS)
 
 def latlon_to_pixel(latitude, longitude, width=64, height=64):
     """
@@ -135,44 +367,43 @@ def latlon_to_pixel(latitude, longitude, width=64, height=64):
 
 def get_time_from_api(requests, local_rtc):
     """
-    Fetch current time from timeapi.io
+    Fetch current time (and the UTC offset) from timeapi.io
     Returns: True if successful, False otherwise
     """
     url = "https://www.timeapi.io/api/timezone/zone?timeZone=America%2FLos_Angeles"
 
-    for attempt in range(3):
+    def fetch():
+        global utc_offset_sec
+        response = requests.get(url, timeout=5)
         try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                timestring = response.json()['currentLocalTime']
-                timestring = timestring.split('.')[0]
-                local_rtc.datetime = adafruit_datetime.datetime.fromisoformat(timestring).timetuple()
-                debug_print(f"Updated time from API to: {timestring}")
-                return True
-            else:
-                debug_print(f"ISS API returned status code: {response.status_code}")
-        except Exception as e:
-            debug_print(f"Error fetching ISS position (attempt {attempt + 1}): {e}")
-            if not is_wifi_connected():
-                reconnect_wifi()
-            time.sleep(2)
-    return None
+            if response.status_code != 200:
+                raise FetchError(f"Time API returned status code: {response.status_code}")
+            data = response.json()
+        finally:
+            response.close()
+        timestring = data['currentLocalTime']
+        timestring = timestring.split('.')[0]
+        local_rtc.datetime = adafruit_datetime.datetime.fromisoformat(timestring).timetuple()
+        utc_offset_sec = data['currentUtcOffset']['seconds']
+        debug_print(f"Updated time from API to: {timestring}")
+        return True
+
+    return time_endpoint.call(fetch) is not None
 
 ################################################################################
 # Main
 
 def main():
+    boot_stage("main")
+
     # WiFi checker
     last_wifi_check = 0
 
-    # ISS tracking variables
-    iss_lat = None
-    iss_lon = None
-    last_iss_update = 0
-
     # Time update variables
     last_time_update = 0
     last_time_display_update = 0
+    time_display_wait = 0 # ms until the displayed minute could change
+    shown_minute = -1
 
     # Realtime clock
     local_rtc = rtc.RTC()
@@ -190,13 +421,13 @@ def main():
 
     # RGB Matrix initialization
     matrix = rgbmatrix.RGBMatrix(
-        width=WIDTH, height=HEIGHT, bit_depth=5,
+        width=WIDTH, height=HEIGHT, bit_depth=BIT_DEPTH,
         rgb_pins=[board.MTX_R1, board.MTX_G1, board.MTX_B1,
                 board.MTX_R2, board.MTX_G2, board.MTX_B2],
         addr_pins=[board.MTX_ADDRA, board.MTX_ADDRB, board.MTX_ADDRC,
                 board.MTX_ADDRD, board.MTX_ADDRE],
         clock_pin=board.MTX_CLK, latch_pin=board.MTX_LAT, output_enable_pin=board.MTX_OE,
-        doublebuffer=False)
+        doublebuffer=DOUBLEBUFFER)
 
     # Initialize display
     display = framebufferio.FramebufferDisplay(
@@ -232,21 +463,13 @@ def main():
     palette[14] = 0xf8e0f8
     palette.make_transparent(0)
 
-    # Palettized bitmap layer for sprite mode - in front of regular bitmap layer
-    palettized_bitmap = displayio.Bitmap(WIDTH,HEIGHT,256)
-    tg2 = displayio.TileGrid(palettized_bitmap,pixel_shader=palette)
-    #g1.append(tg2) # Comment this line out if not using this layer (for faster updates)
+    # Sprite layer - in front of regular bitmap layer
+    sprite_group = displayio.Group()
+    g1.append(sprite_group)
 
     # Set root display object
     display.root_group = g1
-    # display.refresh()
-
-    # Perfomance tracking
-    fps_sum = 0
-    fps_samples = 0
-    fps_start = -1
-    last_print_time = 0
-    last_fps = 0
+    boot_stage("display ready")
 
     # Load the world map image
     try:
@@ -257,13 +480,37 @@ def main():
     except Exception as e:
         debug_print(f"Error loading world map: {e}")
         world_map_bitmap = None
-
-    # Perfomance tracking
-    fps_sum = 0
-    fps_start = supervisor.ticks_ms()
-    last_print_time = 0
+    boot_stage("map loaded")
+
+    # Get the map on the panel before doing anything slow
+    if world_map_bitmap is not None:
+        bitmaptools.blit(bitmap, world_map_bitmap, 0, 0)
+    display.refresh()
+    boot_stage("first frame")
+
+    # Gamma corrected, dithered copies of the map (one per dither phase) now the panel isn't blank
+    import_color_modules()
+    color_pipeline = ColorPipeline(BIT_DEPTH, GAMMA)
+    map_frames = None
+    if world_map_bitmap is not None:
+        map_frames = color_pipeline.build_frames(world_map_bitmap)
+    dither_phase = 0
+    boot_stage("map dithered")
+
+    # Set up the clock text label (shows dashes until we have the time)
+    import_text_modules()
+    time_font = bitmap_font.load_font("/ArcadeNormal-8.bdf")
+    time_text_area = label.Label(time_font, text="--:--", color=0x400000)
+    time_text_area.x = 32 - (time_text_area.width // 2)  # Center horizontally
+    time_text_area.y = 58  # Near bottom (64 - 6 pixels from bottom)
+    g1.append(time_text_area)
+    display.refresh()
+    boot_stage("clock shown")
 
     # Connect to the Internet
+    import_network_modules()
+    make_endpoints()
+    boot_stage("network modules imported")
     debug_print(f"My MAC address: {[hex(i) for i in wifi.radio.mac_address]}") # show our MAC
 
     # Show which WiFi networks we can see (comment this back in to survey the wifi in your area)
@@ -274,138 +521,177 @@ def main():
     # wifi.radio.stop_scanning_networks() # stop scanning
 
     # Connect the specified access point in the TOML file
-    debug_print( f"WiFi Connecting to {os.getenv("CIRCUITPY_WIFI_SSID")}" )
+    ssid = os.getenv("CIRCUITPY_WIFI_SSID")
+    debug_print(f"WiFi Connecting to {ssid}")
     try:
-        wifi.radio.connect(os.getenv("CIRCUITPY_WIFI_SSID"),os.getenv("CIRCUITPY_WIFI_PASSWORD"))
+        wifi.radio.connect(ssid, os.getenv("CIRCUITPY_WIFI_PASSWORD"))
     except Exception as e:
-        debug_print(f"Could not connect to {os.getenv("CIRCUITPY_WIFI_SSID")}" )
+        debug_print(f"Could not connect to {ssid}")
+    boot_stage("wifi connected")
         
     # Set up objects so we can do Web API requests
     pool = socketpool.SocketPool(wifi.radio)
     requests = adafruit_requests.Session(pool, ssl.create_default_context())
-
-    # Grab the current time via the timeapi.io API (set a timeout so we don't wait forever)
-    debug_print( f"CircuitPython thinks the time/date is {adafruit_datetime.datetime.today()}\nGetting time from API" )
-    try:
-        response = requests.request("GET", "https://www.timeapi.io/api/timezone/zone?timeZone=America%2FLos_Angeles", timeout=2 )
-        """ example response
-        {
-        "timeZone": "America/Los_Angeles",
-        "currentLocalTime": "2025-08-18T17:15:28.519488",
-        ...
-        }
-        """
-        if response.status_code == 200:
-            debug_print("Got time from API - Parsing")
-            # parse the JSON
-        #    debug_print( f"Response was:\n{response.json()}" )
-            timestring = response.json()['currentLocalTime']
-            # knock off the fractional seconds to prevent exceptions in the parser
-            timestring = timestring.split('.')[0]
-            local_rtc.datetime = adafruit_datetime.datetime.fromisoformat(timestring).timetuple() # Convert to actual datetime object and set the controller's time
-            debug_print( f"Updating local timesource to {timestring}" )
-        else:
-            debug_print("Get response was {response}")
-    except Exception as e:
-        debug_print(f"API check failed {e}")
-
-    # Use the main bitmap for drawing
-    # Clear the existing group and set up fresh
-    g1 = displayio.Group(scale=1)
-    cc = displayio.ColorConverter(input_colorspace=displayio.Colorspace.RGB565)
-    tg1 = displayio.TileGrid(bitmap, pixel_shader=cc)
-    g1.append(tg1)
-    display.root_group = g1
+    if RECORD_SCENARIO:
+        from recorder import RecordingSession
+        requests = RecordingSession(requests, RECORD_SCENARIO, supervisor.ticks_ms)
 
     # Get initial time
-    debug_print(f"Getting initial time from API")
-    get_time_from_api(requests, local_rtc)
-
-    # After your display setup and before the main loop, set up the text label
-    time_font = bitmap_font.load_font("/ArcadeNormal-8.bdf")
-    time_text_area = label.Label(time_font, text="--:--", color=0x400000)
-    time_text_area.x = 32 - (time_text_area.width // 2)  # Center horizontally
-    time_text_area.y = 58  # Near bottom (64 - 6 pixels from bottom)
-
-    # Add the text to your display group
-    g1.append(time_text_area)
-
-    # Force a display refresh to test if text is visible
-    time_text_area.text = "12:34"
-    time_text_area.x = 32 - (time_text_area.width // 2)
-    # display.refresh()
-    debug_print(f"Text area set to: {time_text_area.text}, position: ({time_text_area.x}, {time_text_area.y})")
+    debug_print("Getting initial time from API")
+    last_time_update = supervisor.ticks_ms()
+    if not get_time_from_api(requests, local_rtc):
+        last_time_update = ticks_add(last_time_update, -(TIME_UPDATE_INTERVAL_MS + 1)) # Keep trying (with backoff) in the loop
+    boot_stage("time set")
+
+    # Tracked objects all get positioned on the first pass through the loop
+    import_tracking_modules()
+    boot_stage("tracking modules imported")
+    tracker = make_tracker(requests, color_pipeline)
+    iss_blink = None
+    if SPRITES:
+        iss_blink = make_sprites(tracker, sprite_group, palette)
+
+    # Zoomed in view (zoom 0 is the normal world map)
+    tile_map = TileMap(TileCache(TILE_ROOT, TILE_SIZE, TILE_CACHE_SIZE),
+                       latlon_to_pixel, FOLLOW_NORAD_ID, MAX_ZOOM, WIDTH, HEIGHT)
+    up_was_pressed = False
+    down_was_pressed = False
+    last_wifi_check = last_time_update
+
+    # Push mode (falls back to the polling above whenever the broker can't be reached)
+    push = make_push_client(pool, tracker, local_rtc)
+    last_push_poll = last_time_update
+    if push is not None:
+        reconnect_push(push, push.connect_timeout)
+        boot_stage("push connected" if push.connected else "push unavailable")
+
+    # Start the loop with a clean heap so the telemetry only sees what the loop does
+    telemetry = Telemetry(STAGE_NAMES)
+    gc.collect()
+    telemetry.start()
+    last_print_time = supervisor.ticks_ms()
+    last_time_display_update = last_print_time # ticks are only compared with ticks_diff(), so not 0
 
     # Main Loop
+    # Nothing in here should allocate from the heap in steady state - only the
+    # network polls, the once a minute clock update and the telemetry report do,
+    # and the polls collect straight afterwards so the gc pause doesn't land in a
+    # later frame (tools/alloc_check.py checks this on a computer)
     while True:
-        # Timing stuff for FPS calculations
         ticks = supervisor.ticks_ms()
-        delta = (ticks - fps_start) / 1000
-        fps_start = ticks
-
-        if delta < 0 or delta > 1000:
-            delta = 0.016
 
-        # Check for WiFi (and reconnect if needed)
-        if (ticks - last_wifi_check) > (WIFI_CHECK_INTERVAL_SEC * 1000):
+        # Check for WiFi (and reconnect if needed - retried as often as the backoff allows)
+        if ticks_diff(ticks, last_wifi_check) > WIFI_CHECK_INTERVAL_MS or (wifi_endpoint.failures and wifi_endpoint.ready(ticks)):
             debug_print("Performing WiFi check")
-            if not is_wifi_connected():
+            if is_wifi_connected():
+                if wifi_endpoint.failures:
+                    wifi_endpoint.reset() # Came back by itself, stop retrying
+            else:
                 debug_print("WiFi connection lost. Reconnecting.")
                 reconnect_wifi()
+            for endpoint in (wifi_endpoint, iss_endpoint, time_endpoint, tle_endpoint):
+                endpoint.report(debug_print)
+            if push is not None:
+                push_endpoint.report(debug_print)
+                push.report(debug_print)
+            tile_map.cache.report(debug_print)
             last_wifi_check = ticks
-
-        # Update ISS position every minute
-        if (ticks - last_iss_update) > (ISS_UPDATE_INTERVAL_SEC * 1000):
-            debug_print("Requesting ISS location")
-            iss_position = get_iss_position(requests)
-            if iss_position:
-                iss_lat, iss_lon = iss_position
-            last_iss_update = ticks
-            debug_print(f"ISS lat: {iss_lat}, lon: {iss_lon}")
-
-        # Update time from API every hour
-        if (ticks - last_time_update) > (TIME_UPDATE_INTERVAL_SEC * 1000):
+            telemetry.collect(STAGE_WIFI)
+        telemetry.end_stage(STAGE_WIFI)
+
+        # Handle pushed positions/time (or retry the broker now and then)
+        if push is not None and ticks_diff(ticks, last_push_poll) > PUSH_POLL_INTERVAL_MS:
+            if push.connected:
+                if push.poll(ticks):
+                    if push.last_time_ticks == ticks: # Only set for fresh time messages (see push.py)
+                        last_time_update = ticks
+                        time_display_wait = 0 # Show the new time straight away
+                elif not push.connected:
+                    push_endpoint.failed(ticks, "connection lost") # Back off before reconnecting
+                # MiniMQTT's loop() allocates on every call, even with nothing to read (its
+                # debug log string, a list of what it read and the timeout error), so collect
+                # after every poll: a short pause each time (counted in the telemetry's push
+                # gc column) rather than the heap filling up and a long one at some random frame
+                telemetry.collect(STAGE_PUSH)
+            elif push_endpoint.ready(ticks):
+                # A short timeout, as the display waits on it (the broker's often still down)
+                reconnect_push(push, push.retry_timeout)
+                telemetry.collect(STAGE_PUSH)
+            last_push_poll = ticks
+        telemetry.end_stage(STAGE_PUSH)
+
+        # Update the positions of any tracked objects that are due
+        if tracker.update(ticks):
+            telemetry.collect(STAGE_TRACK)
+        telemetry.end_stage(STAGE_TRACK)
+
+        # Update time from API every hour (if it fails, keep trying as often as the backoff allows)
+        if ticks_diff(ticks, last_time_update) > TIME_UPDATE_INTERVAL_MS and time_endpoint.ready(ticks):
             debug_print("Requesting time update")
-            get_time_from_api(requests, local_rtc)
-            last_time_update = ticks
+            if get_time_from_api(requests, local_rtc):
+                last_time_update = ticks
+                time_display_wait = 0 # Show the new time straight away
+            telemetry.collect(STAGE_TIME)
 
-        # Update time display on screen every second
-        if (ticks - last_time_display_update) > 1000:
+        # Update time display on screen when the minute changes
+        if ticks_diff(ticks, last_time_display_update) >= time_display_wait:
             current_time = local_rtc.datetime
-            time_string = f"{current_time.tm_hour:02}:{current_time.tm_min:02}"
-            time_text_area.text = time_string
-            time_text_area.x = 32 - (time_text_area.width // 2)
+            minute = current_time.tm_hour * 60 + current_time.tm_min
+            if minute != shown_minute:
+                time_text_area.text = TWO_DIGITS[current_time.tm_hour] + ":" + TWO_DIGITS[current_time.tm_min]
+                time_text_area.x = 32 - (time_text_area.width // 2)
+                shown_minute = minute
+            # No need to read the RTC again until the next minute starts
+            time_display_wait = (60 - current_time.tm_sec) * 1000
             last_time_display_update = ticks
+            current_time = None
+        telemetry.end_stage(STAGE_TIME)
+
+        # Zoom in/out when the up/down buttons are pressed (value is False while held)
+        up_pressed = not up_button.value
+        if up_pressed and not up_was_pressed:
+            tile_map.set_zoom(tile_map.zoom + 1)
+        up_was_pressed = up_pressed
+        down_pressed = not down_button.value
+        if down_pressed and not down_was_pressed:
+            tile_map.set_zoom(tile_map.zoom - 1)
+        down_was_pressed = down_pressed
+
+        # Blink the ISS light (palette swap, no redrawing)
+        if iss_blink is not None:
+            iss_blink.update(ticks)
 
         # Clear the bitmap
         bitmap.fill(0)
-        
-        # Copy the map to the bitmap as the base layer
-        if world_map_bitmap:
-            bitmaptools.blit(bitmap, world_map_bitmap, 0, 0)
-
-        # Draw ISS position if we have it
-        if iss_lat is not None and iss_lon is not None:
-            # Convert lat/lon to x/y on the mercator projection map
-            x, y = latlon_to_pixel(iss_lat, iss_lon)
 
-            # Optional: draw a small cross hair
-            bitmaptools.draw_line(bitmap, x-1, y, x+1, y, 0x0800)
-            bitmaptools.draw_line(bitmap, x, y-1, x, y+1, 0x0800)
-
-            # Draw a bright red circle for the ISS
-            bitmap[x, y] = 0xF800
+        if tile_map.zoom > 0:
+            # Zoomed in - cached tiles (and markers) around the followed object
+            tile_map.follow(tracker)
+            tile_map.draw(bitmap)
+        else:
+            # Copy the map to the bitmap as the base layer
+            # (a different dither phase each frame)
+            if map_frames is not None:
+                bitmaptools.blit(bitmap, map_frames[dither_phase], 0, 0)
+                dither_phase += 1
+                if dither_phase == color_pipeline.phases:
+                    dither_phase = 0
+
+            # Draw the markers for everything we have a position for
+            tracker.draw(bitmap)
+        telemetry.end_stage(STAGE_DRAW)
 
         # Manually update the display
         if not display.auto_refresh:
             display.refresh()
+        telemetry.end_stage(STAGE_REFRESH)
         
-        # FPS tracking
-        fps_sum += 1
-        if ticks - last_print_time > 1000:
-            debug_print(f"FPS: {fps_sum}")
-            fps_sum = 0
+        # FPS and heap tracking (the report allocates, so it's counted as a stage of its own)
+        telemetry.end_frame()
+        if ticks_diff(ticks, last_print_time) > REPORT_INTERVAL_MS:
+            telemetry.report(debug_print)
             last_print_time = ticks
+        telemetry.end_stage(STAGE_REPORT)
 
         # Delay if we're auto-refreshing
         if display.auto_refresh:
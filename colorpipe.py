@@ -0,0 +1,80 @@
+# Gamma correction and temporal dithering for running the matrix at a low bit depth
+#
+# The matrix driver only shows the top bit_depth bits of each RGB565 channel, and
+# the lower the bit depth the faster the panel refreshes and the less CPU time the
+# driver takes from our loop. To keep the in-between shades we:
+#
+#   1. Run each channel through a gamma LUT into fixed point (4 fractional bits)
+#   2. Add a threshold from a 2x2 Bayer table before dropping the fraction
+#   3. Rotate the thresholds every frame, so each pixel flips between the two
+#      nearest levels and averages out to the shade in between
+#
+# Doing that per pixel per frame would be far too slow in Python, so it's only
+# done once for static images (e.g. the world map): build_frames() returns one
+# pre-dithered copy per phase, and the main loop just blits the next one.
+#
+# Only build_frames() needs displayio, so tools/make_tiles.py can use the same
+# LUTs and rounding on a PC.
+
+FRACTION_BITS = 4
+BAYER = ((0, 2), (3, 1)) # 2x2 ordered dither table (threshold index for each x/y)
+THRESHOLDS = (2, 6, 10, 14) # Threshold index -> amount added before dropping the fraction (out of 16)
+
+class ColorPipeline:
+    """ Gamma LUTs and frame-rotating dither tables for a given matrix bit depth """
+    phases = 4 # Number of frames it takes to cycle through all the thresholds
+
+    def __init__( self, bit_depth, gamma=2.2 ):
+        self.bit_depth = bit_depth
+        self.gamma = gamma
+        self.lut5 = self.build_lut(5) # Red and blue
+        self.lut6 = self.build_lut(6) # Green
+
+    def build_lut( self, bits ):
+        """ Channel value (bits wide) -> gamma corrected output level in fixed point """
+        in_max = (1 << bits) - 1
+        out_max = ((1 << self.bit_depth) - 1) << FRACTION_BITS
+        return [int(((v / in_max) ** self.gamma) * out_max + 0.5) for v in range(in_max + 1)]
+
+    def quantize565( self, color, threshold, keep_lit=False ):
+        """
+        Gamma correct an RGB565 color and round it to the matrix bit depth using threshold
+        (with keep_lit, channels that were on stay at level 1 or more instead of rounding to off)
+        """
+        r = self.level(self.lut5, color >> 11, threshold, keep_lit)
+        g = self.level(self.lut6, (color >> 5) & 0x3F, threshold, keep_lit)
+        b = self.level(self.lut5, color & 0x1F, threshold, keep_lit)
+        # The driver uses the top bits of each channel
+        return (r << (16 - self.bit_depth)) | (g << (11 - self.bit_depth)) | (b << (5 - self.bit_depth))
+
+    def level( self, lut, value, threshold, keep_lit ):
+        """ One channel through the LUT, rounded down to the matrix bit depth after adding threshold """
+        out = min((1 << self.bit_depth) - 1, (lut[value] + threshold) >> FRACTION_BITS)
+        if keep_lit and value and not out:
+            return 1
+        return out
+
+    def correct565( self, color ):
+        """ Gamma corrected color for things that aren't dithered (markers etc.) """
+        # Nothing averages a dim color out over frames here, so don't let it go dark
+        return self.quantize565(color, 1 << (FRACTION_BITS - 1), True)
+
+    def build_frames( self, source ):
+        """ One gamma corrected, dithered copy of an RGB565 bitmap for each phase """
+        import displayio
+        frames = [displayio.Bitmap(source.width, source.height, 65535) for _ in range(self.phases)]
+
+        # Images only have a handful of distinct colors, so work each one out once
+        variants = {} # color -> output for each threshold index
+        for y in range(source.height):
+            bayer_row = BAYER[y & 1]
+            for x in range(source.width):
+                color = source[x, y]
+                out = variants.get(color)
+                if out is None:
+                    out = tuple(self.quantize565(color, t) for t in THRESHOLDS)
+                    variants[color] = out
+                index = bayer_row[x & 1]
+                for phase in range(self.phases):
+                    frames[phase][x, y] = out[(index + phase) & 3]
+        return frames
@@ -0,0 +1,119 @@
+# Shared fetch layer: per endpoint exponential backoff and a circuit breaker
+#
+# Every call to an endpoint is a single attempt (no sleeping and retrying in
+# place, which stalls the display). After a failure the endpoint backs off
+# (base * 2^failures, with jitter, up to a maximum) and calls made before then
+# are skipped straight away. After failure_threshold failures in a row the
+# breaker opens: nothing is sent for at least open_ms (longer once the backoff
+# has grown past it, and jittered too), then one probe is let through (half
+# open). If the probe works the breaker closes again, if not it reopens.
+#
+# The last good value is kept in last_value, so callers can keep showing it
+# while the endpoint is failing. Calls made while we're offline (see online)
+# are skipped, so a WiFi drop doesn't open every API's breaker.
+#
+# ticks wrap around (every 2^29 ms, about 6 days, for supervisor.ticks_ms), so
+# they're only ever compared with ticks_diff() and moved on with ticks_add().
+from random import random
+from adafruit_ticks import ticks_add, ticks_diff
+
+CLOSED = 0
+OPEN = 1
+HALF_OPEN = 2
+STATE_NAMES = ("closed", "open", "half-open")
+
+class FetchError(Exception):
+    """ The endpoint answered, but not with something we can use (e.g. a 5xx status) """
+    pass
+
+class Endpoint:
+    """ Backoff and circuit breaker state (and counters) for one API """
+    state = CLOSED
+    failures = 0        # Failures in a row
+    next_attempt = None # ticks before which calls are skipped (None for no backoff)
+    last_value = None   # Last good result
+
+    # Counters since the last report
+    attempts = 0
+    successes = 0
+    skipped = 0         # Calls that were skipped because of backoff, the breaker or being offline
+    blocked_ms = 0      # Time spent waiting on attempts (good or bad)
+
+    def __init__( self, name, ticks_ms, base_backoff_ms=2000, max_backoff_ms=300000,
+                  failure_threshold=3, open_ms=120000, output=print, online=None ):
+        # ticks_ms() is the clock to use (e.g. supervisor.ticks_ms)
+        # output(*args) is where failures and state changes are sent (e.g. a debug print)
+        # online() returns False when there's no point trying (e.g. WiFi is down), None to always try
+        self.name = name
+        self.ticks_ms = ticks_ms
+        self.output = output
+        self.online = online
+        self.base_backoff_ms = base_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.failure_threshold = failure_threshold
+        self.open_ms = open_ms
+
+    def ready( self, ticks ):
+        """ True if an attempt is allowed now (doesn't change any state, so it's safe to poll) """
+        return self.next_attempt is None or ticks_diff(ticks, self.next_attempt) >= 0
+
+    def call( self, attempt ):
+        """ Run attempt() once if allowed, returns its result or None if it failed or was skipped """
+        start = self.ticks_ms()
+        if not self.ready(start) or (self.online is not None and not self.online()):
+            self.skipped += 1
+            return None
+        if self.state == OPEN:
+            self.state = HALF_OPEN # This attempt is the probe
+        self.attempts += 1
+        try:
+            value = attempt()
+        except Exception as e:
+            now = self.ticks_ms()
+            self.blocked_ms += ticks_diff(now, start)
+            self.failed(now, e)
+            return None
+        now = self.ticks_ms()
+        self.blocked_ms += ticks_diff(now, start)
+        self.succeeded(value)
+        return value
+
+    def succeeded( self, value ):
+        self.reset()
+        self.successes += 1
+        self.last_value = value
+
+    def reset( self ):
+        """ Forget any failures (e.g. it turned out to be working without us asking) """
+        if self.state != CLOSED:
+            self.output(f"{self.name}: working again, closing the breaker")
+        self.state = CLOSED
+        self.failures = 0
+        self.next_attempt = None
+
+    def failed( self, ticks, error ):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.output(f"{self.name}: {self.failures} failures in a row ({error}), opening the breaker")
+            self.state = OPEN
+        else:
+            self.output(f"{self.name}: failed ({error})")
+        # Half to full backoff ("equal jitter"), so a bunch of clocks don't retry in step
+        backoff = min(self.max_backoff_ms, self.base_backoff_ms << min(self.failures - 1, 16))
+        wait = int(backoff * (0.5 + random() * 0.5))
+        if self.state == OPEN:
+            # Open for at least open_ms (plus up to half again, for the same reason)
+            wait = max(wait, self.open_ms + int(self.open_ms * random() * 0.5))
+        self.next_attempt = ticks_add(ticks, wait)
+
+    def report( self, output=print ):
+        """ Send the counters gathered since the last report to output, then start over """
+        if self.attempts or self.skipped:
+            rate = 100 * self.successes // self.attempts if self.attempts else 0
+            output(f"{self.name}:", STATE_NAMES[self.state], "attempts:", self.attempts,
+                   "success %:", rate, "skipped:", self.skipped, "blocked ms:", self.blocked_ms)
+        self.attempts = 0
+        self.successes = 0
+        self.skipped = 0
+        self.blocked_ms = 0
@@ -0,0 +1,138 @@
+# Optional MQTT push mode
+#
+# Instead of polling the web APIs, keep one MQTT connection open to a broker
+# that a host-side feeder (tools/mqtt_feeder.py) publishes to:
+#
+#   <prefix>/position/<norad id>   "lat,lon[,sent unix time]"
+#   <prefix>/time                  "unix time (UTC),utc offset in seconds"
+#
+# Payloads are plain comma separated numbers so they're cheap to parse. Pushed
+# positions reset each tracked object's update timer, so the polling providers
+# only kick in again if the pushes stop arriving (e.g. the broker goes away).
+#
+# Time messages are checked against the feeder's own clock, not ours (which
+# may be the one that's wrong): the sent time on the last position it pushed,
+# moved on by the ticks since. One more than max_time_age seconds behind that
+# is old (e.g. retained) and ignored, so it can't set the clock back, and one
+# is only used once a position has come in to check it against.
+import adafruit_minimqtt.adafruit_minimqtt as MQTT
+from adafruit_ticks import ticks_diff
+
+class PushClient:
+    """ Keeps the MQTT connection and hands received positions/time to callbacks """
+    connected = False
+    last_time_ticks = None      # ticks of the last time message we used
+    max_time_age = 5            # seconds, time messages further behind the feeder's clock are ignored
+    feeder_time = None          # unix time the feeder last sent something at (None until it has)
+    feeder_ticks = 0            # ticks when that arrived
+    connect_timeout = 5         # seconds, for connecting (TCP and TLS) and subscribing at boot
+    retry_timeout = 0.5         # seconds, the same for reconnecting from the loop (the display waits on it)
+    poll_timeout = 0.01         # seconds, how long poll() waits when nothing has arrived
+
+    # Stats since the last report
+    messages = 0
+    bytes_received = 0
+    latency_sum = 0     # seconds, for position messages that carry a sent time
+    latency_samples = 0
+
+    def __init__( self, pool, ssl_context, broker, port, username, password, prefix,
+                  on_position, on_time, utc_now, output=print ):
+        # on_position(norad_id, lat, lon), on_time(unix_utc, utc_offset)
+        # utc_now() returns our current unix time or None (only for the latency stats)
+        # output(*args) is where connection changes and bad messages are sent
+        self.prefix = prefix
+        self.output = output
+        self.on_position = on_position
+        self.on_time = on_time
+        self.utc_now = utc_now
+        self.position_topic = prefix + "/position/"
+        self.time_topic = prefix + "/time"
+        self.ticks = 0
+        self.mqtt = MQTT.MQTT(broker=broker, port=port, username=username, password=password,
+                              socket_pool=pool, ssl_context=ssl_context, is_ssl=port == 8883,
+                              socket_timeout=self.connect_timeout,
+                              recv_timeout=self.connect_timeout * 2, connect_retries=1)
+        self.mqtt.on_message = self.message
+
+    def connect( self, timeout=None ):
+        """ Try to (re)connect and subscribe (within timeout seconds, connect_timeout
+        if None), returns True if connected """
+        timeout = timeout or self.connect_timeout
+        try:
+            # MiniMQTT uses one socket timeout for connecting and for reading (and
+            # loop() won't wait less than it), with no public way to change it: one
+            # to connect, then a short one so polls don't stall the display
+            self.mqtt._socket_timeout = timeout
+            self.mqtt._recv_timeout = timeout * 2 # Waiting for CONNACK/SUBACK
+            self.mqtt.connect()
+            self.mqtt.subscribe(self.position_topic + "+")
+            self.mqtt.subscribe(self.time_topic)
+            self.mqtt._socket_timeout = self.poll_timeout
+            self.mqtt._sock.settimeout(self.poll_timeout)
+            self.connected = True
+            self.output(f"Push mode connected to {self.mqtt.broker}")
+        except Exception as e:
+            self.output(f"Push broker unreachable, polling instead: {e}")
+            self.connected = False
+        return self.connected
+
+    def poll( self, ticks ):
+        """ Handle any waiting messages, returns the number handled """
+        if not self.connected:
+            return 0
+        self.ticks = ticks
+        before = self.messages
+        try:
+            self.mqtt.loop(timeout=self.poll_timeout)
+        except Exception as e:
+            self.output(f"Push connection lost, polling instead: {e}")
+            self.connected = False
+            try:
+                self.mqtt.disconnect()
+            except Exception:
+                pass
+        return self.messages - before
+
+    def message( self, client, topic, payload ):
+        self.messages += 1
+        self.bytes_received += len(topic) + len(payload)
+        try:
+            fields = payload.split(",")
+            if topic == self.time_topic:
+                unix_utc = int(fields[0])
+                if self.feeder_time is None:
+                    self.output("Ignoring push time, nothing from the feeder to check it against yet")
+                    return
+                behind = self.feeder_time + ticks_diff(self.ticks, self.feeder_ticks) // 1000 - unix_utc
+                if behind > self.max_time_age:
+                    self.output(f"Ignoring push time from {behind} s before the feeder's last message")
+                    return
+                self.on_time(unix_utc, int(fields[1]))
+                self.last_time_ticks = self.ticks
+                self.feeder_time = unix_utc
+                self.feeder_ticks = self.ticks
+            elif topic.startswith(self.position_topic):
+                norad_id = int(topic[len(self.position_topic):])
+                self.on_position(norad_id, float(fields[0]), float(fields[1]))
+                if len(fields) > 2:
+                    sent = int(fields[2])
+                    self.feeder_time = sent
+                    self.feeder_ticks = self.ticks
+                    now = self.utc_now()
+                    if now is not None:
+                        self.latency_sum += now - sent
+                        self.latency_samples += 1
+        except (ValueError, IndexError) as e:
+            self.output(f"Bad push message on {topic}: {e}")
+
+    def report( self, output=print ):
+        """ Send the stats gathered since the last report to output, then start over """
+        if self.messages:
+            latency = self.latency_sum / self.latency_samples if self.latency_samples else None
+            output("Push:", "connected" if self.connected else "disconnected",
+                   "messages:", self.messages, "bytes/update:", self.bytes_received // self.messages,
+                   "latency (s):", latency)
+        self.messages = 0
+        self.bytes_received = 0
+        self.latency_sum = 0
+        self.latency_samples = 0
@@ -0,0 +1,71 @@
+# Records every web request the clock makes, so field problems can be replayed
+# on a computer with tools/replay.py
+#
+# A scenario is a JSON lines file, one record per line:
+#
+#   {"t_ms": 1200, "url": "...", "latency_ms": 310, "status": 200, "body": "..."}
+#   {"t_ms": 5000, "url": "...", "latency_ms": 5000, "error": "[Errno 116] ETIMEDOUT"}
+#   {"t_ms": 9000, "wifi": "down"}      (wifi drops, for hand written scenarios)
+#   {"t_ms": 9500, "wifi": "up"}
+#
+# t_ms is the time since recording started. Records are appended as they
+# happen, so the file is still useful if the board resets mid recording.
+import json
+
+TICKS_MAX = (1 << 29) - 1 # supervisor.ticks_ms() wraps, masking differences with this keeps them right
+
+class RecordedResponse:
+    """ Stands in for an adafruit_requests Response once the body has been read """
+
+    def __init__( self, status_code, text ):
+        self.status_code = status_code
+        self.text = text
+
+    def json( self ):
+        return json.loads(self.text)
+
+    @property
+    def content( self ):
+        return self.text.encode()
+
+    def close( self ):
+        pass
+
+class RecordingSession:
+    """ Wraps an adafruit_requests Session and appends every request to a scenario file """
+
+    def __init__( self, session, path, ticks_ms ):
+        # ticks_ms() is the clock to time requests with (e.g. supervisor.ticks_ms)
+        self.session = session
+        self.path = path
+        self.ticks_ms = ticks_ms
+        self.start = ticks_ms()
+
+    def write( self, record ):
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            # Most likely the filesystem is read-only (see boot.py/storage.remount)
+            print(f"Could not record request: {e}")
+
+    def request( self, method, url, **kwargs ):
+        start = self.ticks_ms()
+        record = {"t_ms": (start - self.start) & TICKS_MAX, "url": url}
+        try:
+            response = self.session.request(method, url, **kwargs)
+            text = response.text
+            response.close()
+        except Exception as e:
+            record["latency_ms"] = (self.ticks_ms() - start) & TICKS_MAX
+            record["error"] = str(e)
+            self.write(record)
+            raise
+        record["latency_ms"] = (self.ticks_ms() - start) & TICKS_MAX
+        record["status"] = response.status_code
+        record["body"] = text
+        self.write(record)
+        return RecordedResponse(response.status_code, text)
+
+    def get( self, url, **kwargs ):
+        return self.request("GET", url, **kwargs)
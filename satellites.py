@@ -0,0 +1,301 @@
+# Tracked objects (ISS, Tiangong, Hubble, ...) and the providers that position them
+#
+# Each TrackedObject has its own update interval and marker style. Objects are
+# handed to a provider, and each time the Tracker is updated every provider is
+# given all of its objects that are due in one go, so it can update them with a
+# single request or a single propagation pass:
+#
+#   OpenNotifyProvider - the open-notify ISS endpoint (only knows the ISS)
+#   TLEProvider        - fetches a TLE for each object every few hours, then
+#                        propagates all of them from the orbital elements, so
+#                        position updates don't need the network at all
+#
+# Network access is passed in as functions (see get_iss_position() and get_tle()
+# in code.py), so this module doesn't import any of the network libraries.
+import bitmaptools
+import math
+from adafruit_ticks import ticks_add, ticks_diff # ticks wrap, so they're only compared with ticks_diff
+
+# Marker styles
+MARKER_DOT = 0      # Single pixel
+MARKER_CROSS = 1    # Pixel with a small cross hair around it
+MARKER_BOX = 2      # Pixel with a 3x3 outline around it
+MARKER_NAMES = ("dot", "cross", "box") # By style, for settings that can't import this module first
+
+# Orbit constants
+EARTH_MU = 398600.4418      # km^3/s^2
+EARTH_RADIUS = 6378.137     # km
+EARTH_J2 = 0.00108263
+SEC_PER_DAY = 86400
+UNIX_J2000 = 946728000      # 2000-01-01 12:00 UTC as a unix timestamp
+PI2 = math.pi * 2
+
+class TrackedObject:
+    """ Something we're showing on the map, and how to draw it """
+    name = ""
+    norad_id = 0
+    update_interval_ms = 60000
+    marker = MARKER_CROSS
+    color = 0xF800          # Center pixel (RGB565)
+    outline_color = 0x0800  # Cross hair/box (RGB565)
+
+    lat = None
+    lon = None
+    x = -1 # Pixel position on the map, -1 until we have a position
+    y = -1
+    last_update = None # ticks of the last update attempt
+    sprite = None # sprites.Sprite to move instead of drawing pixels (None to draw into the bitmap)
+
+    def __init__( self, name, norad_id, update_interval_ms=60000,
+                  marker=MARKER_CROSS, color=0xF800, outline_color=0x0800 ):
+        self.name = name
+        self.norad_id = norad_id
+        self.update_interval_ms = update_interval_ms
+        self.marker = marker
+        self.color = color
+        self.outline_color = outline_color
+
+    def due( self, ticks ):
+        return self.last_update is None or ticks_diff(ticks, self.last_update) > self.update_interval_ms
+
+    def draw( self, bitmap ):
+        if self.x >= 0:
+            self.draw_at(bitmap, self.x, self.y)
+
+    def draw_at( self, bitmap, x, y ):
+        if self.sprite is not None:
+            self.sprite.move(x, y)
+            return
+        if self.marker == MARKER_CROSS:
+            bitmaptools.draw_line(bitmap, x-1, y, x+1, y, self.outline_color)
+            bitmaptools.draw_line(bitmap, x, y-1, x, y+1, self.outline_color)
+        elif self.marker == MARKER_BOX:
+            bitmaptools.draw_line(bitmap, x-1, y-1, x+1, y-1, self.outline_color)
+            bitmaptools.draw_line(bitmap, x-1, y+1, x+1, y+1, self.outline_color)
+            bitmaptools.draw_line(bitmap, x-1, y, x-1, y, self.outline_color)
+            bitmaptools.draw_line(bitmap, x+1, y, x+1, y, self.outline_color)
+        bitmap[x, y] = self.color
+
+    def hide( self ):
+        """ Take the sprite off the screen (pixel markers just aren't drawn) """
+        if self.sprite is not None:
+            self.sprite.hide()
+
+class OpenNotifyProvider:
+    """ ISS position from open-notify (one request per update) """
+
+    def __init__( self, fetch_iss_position ):
+        # fetch_iss_position() returns (lat, lon) or None
+        self.fetch_iss_position = fetch_iss_position
+
+    def update( self, objects, ticks ):
+        """ Update all the due objects, returns the objects that got a new position """
+        position = self.fetch_iss_position()
+        if position is None:
+            return ()
+        for obj in objects:
+            obj.lat, obj.lon = position
+        return objects
+
+class OrbitElements:
+    """ The parts of a TLE we need for a simple J2 propagation """
+
+    def __init__( self, line1, line2 ):
+        # Epoch (year + day of year) from line 1, kept as integer unix seconds
+        # so we don't lose precision in CircuitPython's single precision floats
+        year = int(line1[18:20])
+        year += 2000 if year < 57 else 1900
+        day = int(line1[20:23])
+        day_fraction = float("0" + line1[23:32].strip())
+        jan1 = (365 * (year - 1970) + (year - 1969) // 4) * SEC_PER_DAY
+        self.epoch = jan1 + (day - 1) * SEC_PER_DAY + int(day_fraction * SEC_PER_DAY)
+
+        # Elements from line 2
+        deg = math.pi / 180
+        self.inclination = float(line2[8:16]) * deg
+        self.raan = float(line2[17:25]) * deg
+        self.eccentricity = float("0." + line2[26:33].strip())
+        self.arg_perigee = float(line2[34:42]) * deg
+        self.mean_anomaly = float(line2[43:51]) * deg
+        self.mean_motion = float(line2[52:63]) * PI2 / SEC_PER_DAY # rad/s
+
+        # Secular drift of the node and perigee due to the Earth's oblateness
+        n = self.mean_motion
+        e = self.eccentricity
+        a = (EARTH_MU / (n * n)) ** (1 / 3)
+        p = a * (1 - e * e)
+        k = 1.5 * EARTH_J2 * (EARTH_RADIUS / p) ** 2 * n
+        sin_i = math.sin(self.inclination)
+        self.raan_rate = -k * math.cos(self.inclination)
+        self.arg_perigee_rate = k * (2 - 2.5 * sin_i * sin_i)
+        self.cos_i = math.cos(self.inclination)
+        self.sin_i = sin_i
+
+    def latlon( self, unix_time, gmst ):
+        """ Sub-satellite (lat, lon) in degrees at unix_time, gmst is the sidereal angle in radians """
+        dt = unix_time - self.epoch # integer seconds since the TLE epoch
+        e = self.eccentricity
+        m = (self.mean_anomaly + self.mean_motion * dt) % PI2
+
+        # Kepler's equation - a few Newton steps is plenty for near circular orbits
+        ea = m
+        for _ in range(4):
+            ea -= (ea - e * math.sin(ea) - m) / (1 - e * math.cos(ea))
+        nu = 2 * math.atan2(math.sqrt(1 + e) * math.sin(ea / 2),
+                            math.sqrt(1 - e) * math.cos(ea / 2))
+
+        u = self.arg_perigee + self.arg_perigee_rate * dt + nu
+        raan = self.raan + self.raan_rate * dt
+        cos_u = math.cos(u)
+        sin_u = math.sin(u)
+        cos_raan = math.cos(raan)
+        sin_raan = math.sin(raan)
+        x = cos_raan * cos_u - sin_raan * sin_u * self.cos_i
+        y = sin_raan * cos_u + cos_raan * sin_u * self.cos_i
+        z = sin_u * self.sin_i
+
+        lat = math.degrees(math.asin(z))
+        lon = math.degrees(math.atan2(y, x) - gmst)
+        lon = (lon + 180) % 360 - 180
+        return lat, lon
+
+def sidereal_angle( unix_time ):
+    """ Greenwich mean sidereal angle (radians) at unix_time """
+    # Split into whole days and seconds so the float math stays small
+    since_j2000 = unix_time - UNIX_J2000
+    days = since_j2000 // SEC_PER_DAY
+    seconds = since_j2000 % SEC_PER_DAY
+    gmst = 280.46061837 + (0.98564736629 * days) % 360 + 360.98564736629 * seconds / SEC_PER_DAY
+    return math.radians(gmst % 360)
+
+class TLEProvider:
+    """ Positions from orbital elements, one propagation pass updates every due object """
+    tle_interval_ms = 6 * 3600 * 1000 # How often to refresh each object's TLE
+    tle_retry_ms = 5 * 60 * 1000 # How long to leave an object after its TLE couldn't be had
+
+    def __init__( self, fetch_tle, utc_now, output=print ):
+        # fetch_tle(norad_id) returns (line1, line2), () if there's no TLE for
+        # that object, or None if the request failed (or was skipped)
+        # utc_now() returns the current unix time (UTC seconds) or None if we don't know it yet
+        # output(*args) is where bad TLEs are reported
+        self.fetch_tle = fetch_tle
+        self.utc_now = utc_now
+        self.output = output
+        self.elements = {} # norad_id -> OrbitElements
+        self.tle_ticks = {} # norad_id -> ticks of the last TLE download
+        self.tle_failed = {} # norad_id -> ticks of the last attempt that didn't get a TLE
+
+    def refresh_tle( self, objects, ticks ):
+        # Only download one TLE per update so a long list doesn't stall a single frame
+        for obj in objects:
+            failed = self.tle_failed.get(obj.norad_id)
+            if failed is not None and ticks_diff(ticks, failed) < self.tle_retry_ms:
+                # Give the others a turn, so one bad ID can't hog the requests
+                continue
+            last = self.tle_ticks.get(obj.norad_id)
+            if last is None or ticks_diff(ticks, last) > self.tle_interval_ms:
+                tle = self.fetch_tle(obj.norad_id)
+                if not tle:
+                    self.tle_failed[obj.norad_id] = ticks
+                    return
+                self.tle_failed.pop(obj.norad_id, None)
+                self.tle_ticks[obj.norad_id] = ticks
+                try:
+                    self.elements[obj.norad_id] = OrbitElements(tle[0], tle[1])
+                except ValueError as e:
+                    self.output(f"Bad TLE for {obj.name}: {e}")
+                return
+
+    def update( self, objects, ticks ):
+        """ Update all the due objects, returns the objects that got a new position """
+        self.refresh_tle(objects, ticks)
+        now = self.utc_now()
+        if now is None:
+            return ()
+
+        # The sidereal angle is shared by every object, so only work it out once
+        gmst = sidereal_angle(now)
+        updated = []
+        for obj in objects:
+            elements = self.elements.get(obj.norad_id)
+            if elements is not None:
+                obj.lat, obj.lon = elements.latlon(now, gmst)
+                updated.append(obj)
+        return updated
+
+class Tracker:
+    """ The list of tracked objects, and which provider updates each of them """
+
+    def __init__( self, to_pixel ):
+        # to_pixel(lat, lon) returns the (x, y) map position
+        self.to_pixel = to_pixel
+        self.objects = []
+        self.providers = []     # Providers in the order they were added
+        self.assigned = []      # Objects for each provider (same order as providers)
+        self.next_due = []      # ticks before which none of each provider's objects are due (None to check)
+        self.version = 0        # Goes up every time any position changes
+
+    def add( self, obj, provider ):
+        if provider not in self.providers:
+            self.providers.append(provider)
+            self.assigned.append([])
+            self.next_due.append(None)
+        i = self.providers.index(provider)
+        self.assigned[i].append(obj)
+        self.next_due[i] = None # The new object may be due sooner
+        self.objects.append(obj)
+
+    def update( self, ticks ):
+        """ Give each provider its due objects, returns True if any provider was asked for anything """
+        worked = False
+        for i in range(len(self.providers)):
+            # One comparison for a provider with nothing due yet (most frames). Pushed
+            # positions only ever make objects due later, which just means a recheck
+            next_due = self.next_due[i]
+            if next_due is not None and ticks_diff(ticks, next_due) <= 0:
+                continue
+            assigned = self.assigned[i]
+            # Check before building a list, so a recheck with nothing due doesn't allocate
+            any_due = False
+            for obj in assigned:
+                if obj.due(ticks):
+                    any_due = True
+                    break
+            if any_due:
+                worked = True
+                due = [obj for obj in assigned if obj.due(ticks)]
+                for obj in due:
+                    obj.last_update = ticks
+                updated = self.providers[i].update(due, ticks)
+                for obj in updated:
+                    obj.x, obj.y = self.to_pixel(obj.lat, obj.lon)
+                    self.version += 1
+            self.next_due[i] = self.earliest_due(assigned, ticks)
+        return worked
+
+    def earliest_due( self, objects, ticks ):
+        """ ticks at which the first of objects becomes due (ticks itself if one already is) """
+        wait = None
+        for obj in objects:
+            if obj.last_update is None:
+                return ticks
+            left = obj.update_interval_ms - ticks_diff(ticks, obj.last_update)
+            if wait is None or left < wait:
+                wait = left
+        return ticks_add(ticks, max(0, wait))
+
+    def set_position( self, norad_id, lat, lon, ticks ):
+        """ Position pushed from elsewhere (e.g. MQTT), counts as an update so polling waits """
+        for obj in self.objects:
+            if obj.norad_id == norad_id:
+                obj.lat = lat
+                obj.lon = lon
+                obj.x, obj.y = self.to_pixel(lat, lon)
+                obj.last_update = ticks
+                self.version += 1
+                return True
+        return False
+
+    def draw( self, bitmap ):
+        for obj in self.objects:
+            obj.draw(bitmap)
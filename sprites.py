@@ -0,0 +1,85 @@
+# Small sprite engine on top of displayio TileGrids
+#
+# Sprite sheets are palette indexed bitmaps built once (from rows of digits),
+# and index 0 is transparent. Each Sprite is a one tile TileGrid in front of
+# the main bitmap, so moving it is just changing its x/y, nothing gets redrawn.
+# Blinking is done by swapping a palette entry (PaletteBlink), which changes
+# every sprite using that palette at once.
+import displayio
+from adafruit_ticks import ticks_diff
+
+def rgb565_to_888(color):
+    """ RGB565 -> RGB888 (what displayio.Palette wants) """
+    return ((color >> 11) << 19) | (((color >> 5) & 0x3F) << 10) | ((color & 0x1F) << 3)
+
+class SpriteSheet:
+    """ A palette indexed bitmap cut into equal sized tiles """
+
+    def __init__( self, bitmap, palette, tile_width, tile_height ):
+        self.bitmap = bitmap
+        self.palette = palette
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+
+    @staticmethod
+    def from_rows( tiles, palette ):
+        """ Sheet from a list of tiles, each a list of rows of palette index digits ("." is transparent) """
+        tile_height = len(tiles[0])
+        tile_width = len(tiles[0][0])
+        bitmap = displayio.Bitmap(tile_width * len(tiles), tile_height, len(palette))
+        for i in range(len(tiles)):
+            for y in range(tile_height):
+                row = tiles[i][y]
+                for x in range(tile_width):
+                    if row[x] != ".":
+                        bitmap[i * tile_width + x, y] = int(row[x], 16)
+        return SpriteSheet(bitmap, palette, tile_width, tile_height)
+
+class Sprite:
+    """ One tile from a sheet, positioned by its center """
+    x = -1
+    y = -1
+
+    def __init__( self, sheet, tile=0, palette=None ):
+        self.tilegrid = displayio.TileGrid(sheet.bitmap,
+                                           pixel_shader=palette if palette is not None else sheet.palette,
+                                           width=1, height=1,
+                                           tile_width=sheet.tile_width, tile_height=sheet.tile_height,
+                                           default_tile=tile)
+        self.anchor_x = sheet.tile_width // 2
+        self.anchor_y = sheet.tile_height // 2
+        self.tilegrid.hidden = True
+
+    def move( self, x, y ):
+        """ Center the sprite on x, y (and show it) """
+        if x != self.x or y != self.y:
+            self.x = x
+            self.y = y
+            self.tilegrid.x = x - self.anchor_x
+            self.tilegrid.y = y - self.anchor_y
+        if self.tilegrid.hidden:
+            self.tilegrid.hidden = False
+
+    def hide( self ):
+        if not self.tilegrid.hidden:
+            self.tilegrid.hidden = True
+
+class PaletteBlink:
+    """ Blink by cycling one palette entry through a list of colors """
+
+    def __init__( self, palette, index, colors, period_ms ):
+        self.palette = palette
+        self.index = index
+        self.colors = colors
+        self.period_ms = period_ms
+        self.step = 0
+        self.last_ticks = None
+        palette[index] = colors[0]
+
+    def update( self, ticks ):
+        if self.last_ticks is None or ticks_diff(ticks, self.last_ticks) >= self.period_ms:
+            self.last_ticks = ticks
+            self.step += 1
+            if self.step == len(self.colors):
+                self.step = 0
+            self.palette[self.index] = self.colors[self.step]
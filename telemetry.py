@@ -0,0 +1,72 @@
+# Heap and garbage collector telemetry for the main loop
+#
+# The loop is split into stages, and each stage calls end_stage() when it's done.
+# Bytes allocated since the previous call are added to that stage, and if the
+# heap shrank in the meantime the collector must have run, so that's counted as
+# a gc pause for the stage. Nothing in here allocates while tracking, so it
+# doesn't disturb the numbers it's measuring. report() does allocate, so the
+# main loop gives it a stage of its own and that shows up in the next report.
+import gc
+
+class Telemetry:
+    """ Tracks heap allocations and gc pauses for each stage of the main loop """
+    stage_names = ()
+    alloc = []      # Bytes allocated by each stage since the last report
+    gc_pauses = []  # Number of collections that landed in each stage since the last report
+    frames = 0      # Frames since the last report
+    frame_alloc = 0 # Bytes allocated during the last complete frame
+    max_frame_alloc = 0 # Worst frame since the last report
+    mem_free = 0    # gc.mem_free() at the last report
+    last_alloc = 0  # gc.mem_alloc() at the end of the previous stage
+    current_frame_alloc = 0
+
+    def __init__( self, stage_names ):
+        self.stage_names = stage_names
+        self.alloc = [0]*len(stage_names)
+        self.gc_pauses = [0]*len(stage_names)
+        self.last_alloc = gc.mem_alloc()
+
+    def start( self ):
+        """ Start counting from here (e.g. straight after a gc.collect() before the loop) """
+        self.last_alloc = gc.mem_alloc()
+
+    def end_stage( self, stage ):
+        """ Account everything allocated since the last call to this stage """
+        now = gc.mem_alloc()
+        if now < self.last_alloc:
+            self.gc_pauses[stage] += 1
+        else:
+            used = now - self.last_alloc
+            self.alloc[stage] += used
+            self.current_frame_alloc += used
+        self.last_alloc = now
+
+    def collect( self, stage ):
+        """ Run the collector now (e.g. straight after a network poll) and count it against this stage """
+        self.end_stage(stage)
+        gc.collect()
+        self.gc_pauses[stage] += 1
+        self.last_alloc = gc.mem_alloc()
+
+    def end_frame( self ):
+        self.frames += 1
+        self.frame_alloc = self.current_frame_alloc
+        if self.frame_alloc > self.max_frame_alloc:
+            self.max_frame_alloc = self.frame_alloc
+        self.current_frame_alloc = 0
+
+    def report( self, output=print ):
+        """ Send the stats gathered since the last report to output, then start over """
+        self.mem_free = gc.mem_free()
+        frames = self.frames
+        if frames:
+            output("FPS:", frames, "mem_free:", self.mem_free,
+                   "bytes/frame:", sum(self.alloc)//frames, "max:", self.max_frame_alloc)
+            for i in range(len(self.stage_names)):
+                output("  ", self.stage_names[i], "bytes/frame:", self.alloc[i]//frames,
+                       "gc:", self.gc_pauses[i])
+        for i in range(len(self.stage_names)):
+            self.alloc[i] = 0
+            self.gc_pauses[i] = 0
+        self.frames = 0
+        self.max_frame_alloc = 0
@@ -0,0 +1,26 @@
+# The main loop at each matrix bit depth (see tools/bit_depth_bench.py)
+import os
+import sys
+
+TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+sys.path.insert(0, TOOLS)
+import bit_depth_bench
+import replay
+
+def test_every_bit_depth_keeps_up_and_keeps_the_map_shades():
+    world_map = bit_depth_bench.load_png565(os.path.join(replay.ROOT, "world_map.png"))
+    assert world_map[0, 0] != 0 or world_map[32, 32] != 0 # It decoded to something
+    shades = []
+    for depth in (3, 4, 5):
+        bench = bit_depth_bench.BenchHarness(
+            replay.load_scenario(os.path.join(TOOLS, "scenarios", "normal.jsonl")), 30 * 1000, depth, world_map)
+        bench.run()
+        fps, host_ms = bench.result()
+        print(f"BIT_DEPTH {depth}: {fps:.1f} frames/s, {host_ms:.3f} host ms/frame, "
+              f"build_frames {bench.build_ms:.1f} ms, {bench.map_shades} map shades")
+        assert fps > 45 # FRAME_MS is 20
+        assert bench.build_ms > 0
+        shades.append(bench.map_shades)
+    # Dithering keeps over half the map's 918 colors apart even at 3 bits, and more bits keep more
+    assert shades == sorted(shades)
+    assert shades[0] > 500
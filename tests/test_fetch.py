@@ -0,0 +1,59 @@
+# Backoff and circuit breaker (fetch.py) against a permanently failing endpoint
+import importlib
+import os
+import random
+import sys
+import types
+
+import pytest
+
+TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+sys.path.insert(0, TOOLS)
+import replay
+
+@pytest.fixture
+def fetch( monkeypatch ):
+    """ fetch.py on the replay's fake adafruit_ticks (forgotten afterwards, like the harness does) """
+    monkeypatch.setitem(sys.modules, "adafruit_ticks",
+                        types.SimpleNamespace(ticks_add=replay.ticks_add, ticks_diff=replay.ticks_diff))
+    yield importlib.import_module("fetch")
+    del sys.modules["fetch"]
+
+def probe_times( fetch, seconds, start=0 ):
+    """ Seconds at which a dead endpoint gets tried, polled once a second from ticks start """
+    now = [start]
+    endpoint = fetch.Endpoint("dead", lambda: now[0], output=lambda *args: None)
+    tried = []
+    for second in range(seconds):
+        now[0] = replay.ticks_add(start, second * 1000)
+        if endpoint.ready(now[0]):
+            tried.append(second)
+            endpoint.call(lambda: 1 / 0)
+    return tried
+
+def test_open_breaker_backs_off( fetch ):
+    random.seed(1)
+    tried = probe_times(fetch, 3600)
+    gaps = [b - a for a, b in zip(tried[3:], tried[4:])] # Once the breaker is open
+    assert min(gaps) >= 120
+    assert max(gaps) > 180 # The backoff has grown past the open period
+    assert max(gaps) <= 300
+
+def test_clocks_dont_probe_in_step( fetch ):
+    random.seed(2)
+    assert probe_times(fetch, 1800) != probe_times(fetch, 1800)
+
+def test_backoff_across_the_ticks_wrap( fetch ):
+    random.seed(3)
+    start = replay.TICKS_PERIOD - 200 * 1000
+    assert len(probe_times(fetch, 3600, start)) >= 10
+
+def test_wifi_drop_doesnt_fail_the_apis():
+    # WiFi is down from 150 s to 390 s: the APIs are skipped rather than failed,
+    # so they're polled again as soon as WiFi is back, not after their breakers
+    harness = replay.Harness(replay.load_scenario(os.path.join(TOOLS, "scenarios", "wifi_drop.jsonl")), 900 * 1000)
+    harness.run()
+    assert harness.recovery_times() == ({}, {})
+    after = [start for host, start, latency, ok, size in harness.session.log
+             if host == "api.open-notify.org" and start > 390000]
+    assert after and after[0] < 390000 + 120000 + 60000 # WiFi retry backoff, then the ISS interval
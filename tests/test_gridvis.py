@@ -0,0 +1,61 @@
+# What GridVis.update() costs a frame, counted on the replay's fake bitmaptools
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+sys.path.insert(0, TOOLS)
+import replay
+
+FRAMES = 200
+
+class CountingBitmaptools:
+    """ Counts the calls and the pixels they write """
+    def __init__( self ):
+        self.calls = {}
+        self.pixels = 0
+
+    def count( self, name, pixels ):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.pixels += pixels
+
+    def fill_region( self, bitmap, x1, y1, x2, y2, value ):
+        self.count("fill_region", (x2 - x1) * (y2 - y1))
+
+    def blit( self, dest, source, x, y, **kwargs ):
+        self.count("blit", source.width * source.height)
+
+class CountingBitmap(replay.FakeBitmap):
+    def __init__( self, bitmaptools, width, height, value_count=65535 ):
+        super().__init__(width, height, value_count)
+        self.bitmaptools = bitmaptools
+
+    def fill( self, value ):
+        self.bitmaptools.count("fill", self.width * self.height)
+
+@pytest.fixture
+def bitmaptools( monkeypatch ):
+    counter = CountingBitmaptools()
+    monkeypatch.setitem(sys.modules, "bitmaptools", counter)
+    monkeypatch.setitem(sys.modules, "displayio", types.SimpleNamespace(
+        Bitmap=lambda width, height, value_count=65535: CountingBitmap(counter, width, height)))
+    yield counter
+    sys.modules.pop("GridVis", None)
+
+def test_update_only_draws_the_line_spans( bitmaptools ):
+    GridVis = importlib.import_module("GridVis")
+    vis = GridVis.GridVis(64, 64)
+    vis.reset()
+    lines = sum(len(grid.line_offsets) for grid in vis.all_grids) * 2
+    target = CountingBitmap(bitmaptools, 64, 64)
+    for frame in range(FRAMES):
+        vis.update(0.02, target, (1, 1))
+    print(f"GridVis: {lines} spans, per frame: " +
+          ", ".join(f"{calls / FRAMES:g} {name}" for name, calls in bitmaptools.calls.items()) +
+          f", {bitmaptools.pixels // FRAMES} pixels written")
+    # Each line is one 64 pixel span, with no full screen fill or blit on top
+    assert bitmaptools.calls == {"fill_region": lines * FRAMES}
+    assert bitmaptools.pixels == lines * 64 * FRAMES
@@ -0,0 +1,109 @@
+# Push mode (and polling mode, to compare) against a stand-in broker - see
+# ReplayBroker/FakeMQTT in tools/replay.py and tools/scenarios/push.jsonl
+import os
+import sys
+
+TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+sys.path.insert(0, TOOLS)
+import replay
+
+ISS_HOST = "api.open-notify.org"
+BROKER_DOWN_MS = (300000, 420000) # When push.jsonl has the broker down
+PUBLISH_LATENCY_MS = 40
+PUSH_POLL_INTERVAL_MS = 250 # code.py
+
+class StallHarness(replay.Harness):
+    """ Also keeps the gaps between frames once booted, as (start ms, length ms) """
+    boot_ms = 10000
+
+    def __init__( self, *args, **kwargs ):
+        super().__init__(*args, **kwargs)
+        self.gaps = []
+
+    def frame( self ):
+        last = self.last_frame
+        try:
+            super().frame()
+        finally:
+            if last is not None and last >= self.boot_ms:
+                self.gaps.append((last, self.clock.now_ms - last))
+
+    def stall_between( self, start_ms=0, end_ms=None ):
+        return max(length for start, length in self.gaps
+                   if start >= start_ms and (end_ms is None or start < end_ms))
+
+def run( monkeypatch, seconds, push=True ):
+    if push:
+        monkeypatch.setenv("MQTT_BROKER", "test")
+    else:
+        monkeypatch.delenv("MQTT_BROKER", raising=False)
+    harness = StallHarness(replay.load_scenario(os.path.join(TOOLS, "scenarios", "push.jsonl")), seconds * 1000)
+    harness.run()
+    harness.report() # Latency and bytes per update, shown with pytest -s
+    return harness
+
+def requests( harness, host, start_ms, end_ms ):
+    return [entry for entry in harness.session.log if entry[0] == host and start_ms <= entry[1] < end_ms]
+
+def live_updates( harness ):
+    """ (published ms, delivered ms, bytes) for each pushed position that wasn't retained """
+    return [(published, delivered, size) for topic, published, delivered, size, retained
+            in harness.broker.log if not retained and "/position/" in topic]
+
+def test_polling_mode( monkeypatch ):
+    harness = run(monkeypatch, 300, push=False)
+    assert harness.broker.log == []
+    polls = requests(harness, ISS_HOST, 0, 300000)
+    assert len(polls) == 5 # Once a minute
+    assert all(ok for host, start, latency, ok, size in polls)
+
+def test_push_mode_replaces_polling( monkeypatch ):
+    harness = run(monkeypatch, 300)
+    updates = live_updates(harness)
+    assert len(updates) >= 28 # Every 10 s
+    # Latency is the broker's plus up to one poll interval (and a frame)
+    assert max(delivered - published for published, delivered, size in updates) <= \
+        PUBLISH_LATENCY_MS + PUSH_POLL_INTERVAL_MS + replay.FRAME_MS
+    # Each update is smaller than the open-notify response it replaces
+    polled_body = max(size for host, start, latency, ok, size in requests(harness, ISS_HOST, 0, 300000))
+    assert max(size for published, delivered, size in updates) < polled_body
+    # The boot poll is the only one, and the broker never makes the display wait
+    # anything like the connect timeout (the longest gap is a TLE download)
+    assert requests(harness, ISS_HOST, 10000, 300000) == []
+    assert harness.stall_between() < 1000
+
+def test_push_mode_falls_back_to_polling( monkeypatch ):
+    harness = run(monkeypatch, 600)
+    assert len(requests(harness, ISS_HOST, *BROKER_DOWN_MS)) >= 1
+    # Retrying the broker while it's down doesn't stall the display either
+    assert harness.stall_between(BROKER_DOWN_MS[0], BROKER_DOWN_MS[1] + 60000) < 1000
+    # And goes back to push once the broker is back (the clock backs off from half a minute)
+    assert any(delivered > BROKER_DOWN_MS[1] + 60000 for published, delivered, size in live_updates(harness))
+
+def test_stale_retained_time_is_ignored( monkeypatch ):
+    # push.jsonl has a 50 minute old time message retained on the broker,
+    # which the clock gets every time it subscribes
+    harness = run(monkeypatch, 600)
+    assert sum(1 for entry in harness.broker.log if entry[0].endswith("/time") and entry[4]) >= 2
+    assert harness.max_rtc_set_back <= 1
+
+class FastRTCHarness(StallHarness):
+    """ The RTC jumps a minute ahead at rtc_jump_ms (e.g. a bad time poll) """
+    rtc_jump_ms = 60000
+    rtc_jump = 60
+
+    def frame( self ):
+        if self.rtc_jump and self.clock.now_ms >= self.rtc_jump_ms:
+            self.clock.rtc_base += self.rtc_jump
+            self.rtc_jump = 0
+        super().frame()
+
+def test_push_time_corrects_a_fast_clock( monkeypatch ):
+    # The fresh time message at 120 s is a minute behind the RTC by then, but
+    # agrees with the sent times on the feeder's positions, so it's used
+    monkeypatch.setenv("MQTT_BROKER", "test")
+    harness = FastRTCHarness(replay.load_scenario(os.path.join(TOOLS, "scenarios", "push.jsonl")), 200 * 1000)
+    harness.run()
+    local_start = 1735732800 - 28800 # push.jsonl's UTC time and offset at 0 ms
+    assert abs(harness.clock.time() - harness.clock.now_ms // 1000 - local_start) <= 1
+    assert harness.max_rtc_set_back > 50
@@ -0,0 +1,42 @@
+# supervisor.ticks_ms() wraps at 2^29 ms, and on the board it first wraps about
+# 65 s after reset (the replay clock starts there too), so the loop has to keep
+# going across it
+import os
+import sys
+
+TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+sys.path.insert(0, TOOLS)
+import replay
+
+class WrapHarness(replay.Harness):
+    """ Also counts the RTC reads (once a minute, for the clock) after ticks wrap """
+    reads_at_wrap = None
+
+    def frame( self ):
+        super().frame()
+        if self.reads_at_wrap is None and self.clock.ticks_ms() < replay.BOARD_TICKS_START:
+            self.reads_at_wrap = replay.FakeRTC.reads
+
+def scenario( name ):
+    return replay.load_scenario(os.path.join(TOOLS, "scenarios", name + ".jsonl"))
+
+def test_fake_ticks_wrap_like_adafruit_ticks():
+    assert replay.ticks_add(replay.TICKS_MAX, 1) == 0
+    assert replay.ticks_diff(5, replay.TICKS_MAX - 4) == 10
+    assert replay.ticks_diff(replay.TICKS_MAX - 4, 5) == -10
+    assert replay.ticks_less(replay.TICKS_MAX, 0)
+
+def test_clock_keeps_updating_across_the_wrap():
+    harness = WrapHarness(scenario("normal"), 300 * 1000)
+    harness.run()
+    assert harness.reads_at_wrap is not None
+    assert replay.FakeRTC.reads - harness.reads_at_wrap >= 3 # About 4 minutes left after the wrap
+
+def test_endpoints_recover_from_a_storm_across_the_wrap():
+    # 5xx from 2 to 8 minutes, with ticks wrapping 4 minutes in (while backing off)
+    harness = WrapHarness(scenario("5xx_storm"), 900 * 1000)
+    harness.clock.ticks_start = replay.TICKS_PERIOD - 240 * 1000
+    harness.run()
+    recoveries, still_failing = harness.recovery_times()
+    assert still_failing == {}
+    assert "api.open-notify.org" in recoveries
@@ -0,0 +1,110 @@
+# The zoomed in map (tiles.py): following an object and loading tiles ahead of it
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+sys.path.insert(0, TOOLS)
+import replay
+
+TILE_SIZE = 32
+ZOOM = 2 # A 256 pixel map, 8x8 tiles
+
+@pytest.fixture
+def tiles( monkeypatch ):
+    """ tiles.py on the replay's fake displayio/bitmaptools (forgotten afterwards, like the harness does) """
+    monkeypatch.setitem(sys.modules, "displayio", types.SimpleNamespace(Bitmap=replay.FakeBitmap))
+    monkeypatch.setitem(sys.modules, "bitmaptools",
+                        types.SimpleNamespace(blit=replay.fake_blit, readinto=lambda *args: None))
+    yield importlib.import_module("tiles")
+    del sys.modules["tiles"]
+
+@pytest.fixture
+def tile_root( tmp_path ):
+    tiles_across = (64 << ZOOM) // TILE_SIZE
+    os.mkdir(tmp_path / str(ZOOM))
+    for ty in range(tiles_across):
+        for tx in range(tiles_across):
+            (tmp_path / str(ZOOM) / f"{tx}_{ty}.bin").write_bytes(b"")
+    return str(tmp_path)
+
+class Obj:
+    def __init__( self, norad_id, lat, lon ):
+        self.norad_id = norad_id
+        self.lat = lat
+        self.lon = lon
+
+    def draw_at( self, bitmap, x, y ):
+        pass
+
+    def hide( self ):
+        pass
+
+def make_map( tiles, tile_root, objects, capacity=16 ):
+    tracker = types.SimpleNamespace(objects=objects, version=0)
+    # Positions are world pixels already, lat for y and lon for x
+    tile_map = tiles.TileMap(tiles.TileCache(tile_root, TILE_SIZE, capacity),
+                             lambda lat, lon, width, height: (lon, lat), 1)
+    tile_map.set_zoom(ZOOM)
+    return tile_map, tracker
+
+def move( tile_map, tracker, obj, lat, lon ):
+    obj.lat = lat
+    obj.lon = lon
+    tracker.version += 1
+    tile_map.follow(tracker)
+
+def test_other_objects_dont_change_the_direction( tiles, tile_root ):
+    iss = Obj(1, 100, 100)
+    other = Obj(2, 10, 10)
+    tile_map, tracker = make_map(tiles, tile_root, [iss, other])
+    tile_map.follow(tracker)
+    move(tile_map, tracker, iss, 100, 104)
+    assert (tile_map.dir_x, tile_map.dir_y) == (1, 0)
+    move(tile_map, tracker, other, 12, 12)
+    assert (tile_map.dir_x, tile_map.dir_y) == (1, 0)
+
+def cached( tile_map ):
+    """ (tx, ty) of every tile in the cache """
+    return {(key & 0xFFF, (key >> 12) & 0xFFF) for key in tile_map.cache.keys if key >= 0}
+
+def draw( tile_map, frames ):
+    bitmap = replay.FakeBitmap(64, 64)
+    for _ in range(frames):
+        tile_map.draw(bitmap)
+
+def test_prefetch_loads_the_column_ahead_of_a_tile_aligned_view( tiles, tile_root ):
+    iss = Obj(1, 128, 92)
+    tile_map, tracker = make_map(tiles, tile_root, [iss])
+    tile_map.follow(tracker)
+    move(tile_map, tracker, iss, 128, 96) # The view's now x 64-127, y 96-159: tiles 2-3 by 3-4
+    draw(tile_map, 5)
+    assert {(4, 3), (4, 4)} <= cached(tile_map)
+
+def test_prefetch_loads_the_column_row_and_corner_ahead( tiles, tile_root ):
+    iss = Obj(1, 120, 92)
+    tile_map, tracker = make_map(tiles, tile_root, [iss])
+    tile_map.follow(tracker)
+    move(tile_map, tracker, iss, 124, 100) # x 68-131, y 92-155: tiles 2-4 by 2-4
+    draw(tile_map, 1)
+    assert tile_map.cache.loads == 10 # The 9 on screen, and one ahead a frame from then on
+    draw(tile_map, 10)
+    assert tile_map.cache.loads == 16
+    assert {(5, 2), (5, 3), (5, 4), (2, 5), (3, 5), (4, 5), (5, 5)} <= cached(tile_map)
+    # And they all stay cached (nothing is read again) while the view sits still
+    draw(tile_map, 10)
+    assert tile_map.cache.loads == 16
+
+def test_report_counts_loads_and_hits( tiles, tile_root ):
+    iss = Obj(1, 128, 96)
+    tile_map, tracker = make_map(tiles, tile_root, [iss])
+    tile_map.follow(tracker)
+    draw(tile_map, 3) # Tiles 2-3 by 3-4, no direction yet so nothing ahead
+    lines = []
+    tile_map.cache.report(lambda *args: lines.append(args))
+    assert lines == [("Tiles: loads:", 4, "hits:", 8, "missing:", 0)]
+    tile_map.cache.report(lambda *args: lines.append(args))
+    assert len(lines) == 1 # Nothing since
@@ -0,0 +1,76 @@
+# Tracker (satellites.py): asking each provider for its objects only when they're due
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+sys.path.insert(0, TOOLS)
+import replay
+
+START = replay.BOARD_TICKS_START # Wraps about 65 s in, like on the board
+
+@pytest.fixture
+def satellites( monkeypatch ):
+    """ satellites.py on the replay's fake ticks (forgotten afterwards, like the harness does) """
+    monkeypatch.setitem(sys.modules, "bitmaptools", types.SimpleNamespace())
+    monkeypatch.setitem(sys.modules, "adafruit_ticks",
+                        types.SimpleNamespace(ticks_add=replay.ticks_add, ticks_diff=replay.ticks_diff))
+    yield importlib.import_module("satellites")
+    del sys.modules["satellites"]
+
+class Provider:
+    """ Gives every object it's asked for a position, and keeps what it was asked when """
+    def __init__( self ):
+        self.asked = []
+
+    def update( self, objects, ticks ):
+        self.asked.append((ticks, [obj.norad_id for obj in objects]))
+        for obj in objects:
+            obj.lat = 0.0
+            obj.lon = 0.0
+        return objects
+
+def make_tracker( satellites, monkeypatch ):
+    tracker = satellites.Tracker(lambda lat, lon: (0, 0))
+    provider = Provider()
+    tracker.add(satellites.TrackedObject("A", 1, 60000), provider)
+    tracker.add(satellites.TrackedObject("B", 2, 90000), provider)
+    due_calls = []
+    due = satellites.TrackedObject.due
+    monkeypatch.setattr(satellites.TrackedObject, "due", lambda obj, ticks: due_calls.append(ticks) or due(obj, ticks))
+    return tracker, provider, due_calls
+
+def run( tracker, start_ms, end_ms, frame_ms=20 ):
+    for ms in range(start_ms, end_ms, frame_ms):
+        tracker.update(replay.ticks_add(START, ms))
+
+def test_objects_are_only_looked_at_when_one_is_due( satellites, monkeypatch ):
+    tracker, provider, due_calls = make_tracker(satellites, monkeypatch)
+    run(tracker, 0, 20)
+    assert provider.asked == [(START, [1, 2])]
+    del due_calls[:]
+    run(tracker, 20, 60000)
+    assert due_calls == [] # Not one object checked in the 3000 frames until A's due
+    run(tracker, 60000, 100000)
+    assert [(replay.ticks_diff(ticks, START), ids) for ticks, ids in provider.asked[1:]] == \
+        [(60020, [1]), (90020, [2])]
+
+def test_pushed_positions_hold_polling_off( satellites, monkeypatch ):
+    tracker, provider, due_calls = make_tracker(satellites, monkeypatch)
+    run(tracker, 0, 50000)
+    tracker.set_position(1, 10.0, 20.0, replay.ticks_add(START, 50000))
+    run(tracker, 50000, 100000)
+    assert [(replay.ticks_diff(ticks, START), ids) for ticks, ids in provider.asked[1:]] == [(90020, [2])]
+    run(tracker, 100000, 120000)
+    assert [(replay.ticks_diff(ticks, START), ids) for ticks, ids in provider.asked[1:]] == \
+        [(90020, [2]), (110020, [1])]
+
+def test_an_added_object_is_looked_at_straight_away( satellites, monkeypatch ):
+    tracker, provider, due_calls = make_tracker(satellites, monkeypatch)
+    run(tracker, 0, 1000)
+    tracker.add(satellites.TrackedObject("C", 3, 60000), provider)
+    run(tracker, 1000, 1020)
+    assert provider.asked[-1] == (replay.ticks_add(START, 1000), [3])
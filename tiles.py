@@ -0,0 +1,227 @@
+# Zoomable map made of tiles (see tools/make_tiles.py for how they're made)
+#
+# Tiles are raw little endian RGB565, tile_size pixels square, stored as
+# <root>/<zoom>/<tx>_<ty>.bin. Zoom level z is a (64 << z) pixel square map,
+# so zoom 0 is the normal world map (which code.py draws itself).
+#
+# Loaded tiles live in a fixed number of preallocated bitmaps, and the least
+# recently used one gets reused when a new tile is needed. Panning is just
+# blitting the cached tiles at a different offset. The column (and row) of
+# tiles the view is moving into is loaded before it's needed, one tile a frame.
+import bitmaptools
+import displayio
+
+class TileCache:
+    """ Fixed size LRU cache of map tiles """
+
+    def __init__( self, root, tile_size=32, capacity=16 ):
+        self.root = root
+        self.tile_size = tile_size
+        self.bitmaps = [displayio.Bitmap(tile_size, tile_size, 65535) for _ in range(capacity)]
+        self.keys = [-1]*capacity   # Tile key held in each slot (-1 for empty)
+        self.used = [0]*capacity    # When each slot was last used
+        self.counter = 0
+        self.missing = set()        # Keys of tiles that aren't on the card
+        # Counters since the last report
+        self.loads = 0
+        self.hits = 0
+
+    def key( self, zoom, tx, ty ):
+        return (zoom << 24) | (ty << 12) | tx
+
+    def find( self, key ):
+        for i in range(len(self.keys)):
+            if self.keys[i] == key:
+                return i
+        return -1
+
+    def load( self, zoom, tx, ty, key ):
+        """ Read a tile into the least recently used slot, returns the slot or -1 """
+        slot = 0
+        for i in range(1, len(self.used)):
+            if self.used[i] < self.used[slot]:
+                slot = i
+        # The read overwrites the old tile, so it mustn't be found under its old key if the read fails
+        self.keys[slot] = -1
+        try:
+            with open(f"{self.root}/{zoom}/{tx}_{ty}.bin", "rb") as f:
+                bitmaptools.readinto(self.bitmaps[slot], f, 16, 2)
+        except OSError:
+            self.missing.add(key)
+            return -1
+        self.keys[slot] = key
+        self.loads += 1
+        return slot
+
+    def get( self, zoom, tx, ty ):
+        """ The tile bitmap (loading it if needed), or None if there's no such tile """
+        key = self.key(zoom, tx, ty)
+        slot = self.find(key)
+        if slot < 0:
+            if key in self.missing:
+                return None
+            slot = self.load(zoom, tx, ty, key)
+            if slot < 0:
+                return None
+        else:
+            self.hits += 1
+        self.counter += 1
+        self.used[slot] = self.counter
+        return self.bitmaps[slot]
+
+    def prefetch( self, zoom, tx, ty ):
+        """ Make sure a tile is cached without counting it as a hit, returns True if it
+        had to be read (or found to be missing) """
+        key = self.key(zoom, tx, ty)
+        slot = self.find(key)
+        loaded = False
+        if slot < 0:
+            if key in self.missing:
+                return False
+            slot = self.load(zoom, tx, ty, key)
+            if slot < 0:
+                return True
+            loaded = True
+        # As new as the tiles on screen while it's still ahead of the view, so the
+        # ones the view has left get reused first (there's room for the view plus
+        # a row and column ahead)
+        self.used[slot] = self.counter
+        return loaded
+
+    def report( self, output=print ):
+        """ Send the counters gathered since the last report to output, then start over """
+        if self.loads or self.hits:
+            output("Tiles: loads:", self.loads, "hits:", self.hits, "missing:", len(self.missing))
+        self.loads = 0
+        self.hits = 0
+
+class TileMap:
+    """ A zoomed in view of the map that follows one of the tracked objects """
+    zoom = 0
+    max_zoom = 3
+    view_x = 0 # World pixel at the top left of the view
+    view_y = 0
+    dir_x = 0 # Direction the followed object last moved (-1, 0, 1)
+    dir_y = 0
+    version = -1 # Tracker.version the view was last worked out for
+
+    def __init__( self, cache, to_pixel, follow_id, max_zoom=3, width=64, height=64 ):
+        # to_pixel(lat, lon, width, height) returns the (x, y) map position
+        self.cache = cache
+        self.to_pixel = to_pixel
+        self.follow_id = follow_id
+        self.max_zoom = max_zoom
+        self.width = width
+        self.height = height
+        self.follow_x = -1 # World position of the followed object
+        self.follow_y = -1
+        self.markers = [] # (object, world x, world y) for everything with a position
+
+    def set_zoom( self, zoom ):
+        zoom = max(0, min(self.max_zoom, zoom))
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.follow_x = -1
+            self.version = -1 # Work the view out again at the new scale
+
+    def follow( self, tracker ):
+        """ Re-center on the followed object if any positions changed """
+        if self.zoom == 0 or tracker.version == self.version:
+            return
+        self.version = tracker.version
+        size = self.width << self.zoom
+        self.markers = []
+        for obj in tracker.objects:
+            if obj.lat is None:
+                continue
+            x, y = self.to_pixel(obj.lat, obj.lon, size, size)
+            self.markers.append((obj, x, y))
+            # Other objects bump the version too, so only a move counts as a direction
+            if obj.norad_id == self.follow_id and (x != self.follow_x or y != self.follow_y):
+                if self.follow_x >= 0:
+                    self.dir_x = (x > self.follow_x) - (x < self.follow_x)
+                    self.dir_y = (y > self.follow_y) - (y < self.follow_y)
+                self.follow_x = x
+                self.follow_y = y
+                self.view_x = (x - self.width // 2) % size
+                self.view_y = max(0, min(size - self.height, y - self.height // 2))
+
+    def draw( self, bitmap ):
+        """ Blit the visible tiles and markers, then prefetch the next tile along the way """
+        t = self.cache.tile_size
+        zoom = self.zoom
+        tiles_across = (self.width << zoom) // t
+        tiles_down = (self.height << zoom) // t
+        tx0 = self.view_x // t
+        ty0 = self.view_y // t
+        ox = -(self.view_x % t)
+        oy = -(self.view_y % t)
+
+        y = oy
+        ty = ty0
+        while y < self.height and ty < tiles_down:
+            x = ox
+            tx = tx0
+            while x < self.width:
+                tile = self.cache.get(zoom, tx % tiles_across, ty)
+                if tile is not None:
+                    self.blit_clipped(bitmap, tile, x, y)
+                x += t
+                tx += 1
+            y += t
+            ty += 1
+
+        size = self.width << zoom
+        for obj, wx, wy in self.markers:
+            x = (wx - self.view_x) % size
+            y = wy - self.view_y
+            if x < self.width and 0 <= y < self.height:
+                obj.draw_at(bitmap, x, y)
+            else:
+                obj.hide()
+
+        if self.dir_x or self.dir_y:
+            self.prefetch_ahead(tiles_across, tiles_down)
+
+    def prefetch_ahead( self, tiles_across, tiles_down ):
+        """ Load the next tile that isn't cached yet from the column (and then the row) just
+        past the edge of the view in the direction of travel, at most one a frame """
+        t = self.cache.tile_size
+        zoom = self.zoom
+        tx0 = self.view_x // t # The tiles on screen
+        tx1 = (self.view_x + self.width - 1) // t
+        ty0 = self.view_y // t
+        ty1 = min(tiles_down - 1, (self.view_y + self.height - 1) // t)
+        if self.dir_x:
+            tx = tx1 + 1 if self.dir_x > 0 else tx0 - 1
+            for ty in range(ty0, ty1 + 1):
+                if self.cache.prefetch(zoom, tx % tiles_across, ty):
+                    return
+            if self.dir_x > 0: # The row ahead includes the corner
+                tx1 = tx
+            else:
+                tx0 = tx
+        if self.dir_y:
+            ty = ty1 + 1 if self.dir_y > 0 else ty0 - 1
+            if 0 <= ty < tiles_down:
+                for tx in range(tx0, tx1 + 1):
+                    if self.cache.prefetch(zoom, tx % tiles_across, ty):
+                        return
+
+    def blit_clipped( self, bitmap, tile, x, y ):
+        x1 = 0
+        y1 = 0
+        x2 = tile.width
+        y2 = tile.height
+        if x < 0:
+            x1 = -x
+            x = 0
+        if y < 0:
+            y1 = -y
+            y = 0
+        if x + x2 - x1 > bitmap.width:
+            x2 = x1 + bitmap.width - x
+        if y + y2 - y1 > bitmap.height:
+            y2 = y1 + bitmap.height - y
+        if x2 > x1 and y2 > y1:
+            bitmaptools.blit(bitmap, tile, x, y, x1=x1, y1=y1, x2=x2, y2=y2)
@@ -0,0 +1,193 @@
+# Host-side check that the clock's main loop doesn't allocate in steady state
+#
+# Runs main() on the tools/replay.py fakes, with tracemalloc standing in for
+# gc.mem_alloc(): each stage the loop reports to Telemetry is measured as the
+# most memory that was in use at once during the stage, over what was in use
+# when it started. After a warm up, every stage of every frame has to come out
+# at zero, except for the ones the loop is allowed to allocate in:
+#
+#   - a stage that polled the network (it calls Telemetry.collect() afterwards)
+#   - the time stage in a frame where it read the RTC (once a minute)
+#   - the report stage straight after a telemetry report
+#
+# CPython isn't MicroPython: it boxes every int over 256 and heap allocates
+# loop iterators, which MicroPython doesn't, so each stage is allowed what it
+# shows with nothing wrong (CPYTHON_SLACK_BYTES, see --slack 0 for the actual
+# numbers). Floats and small tuples come from free lists in CPython, so
+# tracemalloc doesn't see them - those still have to be caught on the board
+# with the telemetry report.
+#
+#   python tools/alloc_check.py tools/scenarios/normal.jsonl --duration 300
+#
+# Exits with status 1 (listing the frames) if anything allocated where it shouldn't.
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import replay # Also puts the clock's modules on the path
+import telemetry
+
+WARMUP_MS = 5000 # Boot and the first poll of everything aren't checked
+DEFAULT_SLACK_BYTES = 48 # A boxed int or a loop iterator
+CPYTHON_SLACK_BYTES = {
+    "track": 216, # Tracker.update() is two loops deep (range() over the providers, then their
+                  # objects), and Tracker.earliest_due() works in ms over 256
+    "draw": 112,  # Moving the sprites after a position update
+}
+CLOCK_STAGE = "time"
+REPORT_STAGE = "report"
+
+class AllocMeter:
+    """ Stands in for gc.mem_alloc(), adding up the tracemalloc peak of each stage """
+    total = 0
+
+    def __init__( self ):
+        tracemalloc.start()
+        self.rebase()
+
+    def rebase( self ):
+        """ Start measuring from what's in use now """
+        tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak() # Don't count the tuple get_traced_memory() made
+
+    def take( self ):
+        """ Peak bytes in use since the last call, over what was in use then """
+        used = max(0, tracemalloc.get_traced_memory()[1] - self.baseline)
+        self.total += used
+        self.rebase()
+        return used
+
+    def mem_alloc( self ):
+        return self.total
+
+class AllocCheck(replay.Harness):
+    def __init__( self, records, duration_ms, slack=None ):
+        super().__init__(records, duration_ms)
+        self.slack = slack # Bytes every stage is allowed (None for CPYTHON_SLACK_BYTES)
+        self.meter = None
+        self.stage_names = ()
+        self.stage_alloc = []   # Bytes each stage allocated this frame
+        self.carried = 0        # Bytes the current stage allocated before calling an uncounted fake
+        self.polled = set()     # Stages that polled the network this frame
+        self.reported = False   # A telemetry report ran since the last frame ended
+        self.rtc_reads = 0
+        self.checked = 0        # Frames checked
+        self.failures = []      # (ms, stage name, bytes)
+
+    def install( self ):
+        super().install()
+        self.meter = AllocMeter()
+        gc.mem_alloc = self.meter.mem_alloc
+        # The fake ticks are past 2^28, which CPython boxes (MicroPython's small ints go up to 2^30)
+        supervisor = sys.modules["supervisor"]
+        supervisor.ticks_ms = self.uncounted(supervisor.ticks_ms)
+        ticks = sys.modules["adafruit_ticks"]
+        for name in ("ticks_ms", "ticks_add", "ticks_diff", "ticks_less"):
+            setattr(ticks, name, self.uncounted(getattr(ticks, name)))
+
+    def uncounted( self, fake ):
+        """ Wrap a fake so what it allocates doesn't count against the loop """
+        check = self
+        def call( *args ):
+            check.carried += check.meter.take()
+            try:
+                return fake(*args)
+            finally:
+                check.meter.rebase()
+        return call
+
+    def frame( self ):
+        try:
+            super().frame()
+        finally:
+            self.meter.rebase() # The display refresh doesn't count against the loop
+
+    def run( self ):
+        check = self
+        cls = telemetry.Telemetry
+        saved = (cls.__init__, cls.end_stage, cls.collect, cls.end_frame, cls.report)
+        init, end_stage, collect, end_frame, report = saved
+
+        def counted_init( tele, stage_names ):
+            init(tele, stage_names)
+            check.stage_names = stage_names
+            check.stage_alloc = [0]*len(stage_names)
+
+        def counted_end_stage( tele, stage ):
+            check.stage_alloc[stage] += check.carried + check.meter.take()
+            check.carried = 0
+            end_stage(tele, stage)
+            check.meter.rebase() # Nor do the counters (CPython boxes them once they're over 256)
+
+        def counted_collect( tele, stage ):
+            collect(tele, stage)
+            check.polled.add(stage)
+            check.meter.rebase() # The collect freed things, so start again from here
+
+        def counted_end_frame( tele ):
+            check.check_frame()
+            check.meter.rebase() # Nor does checking
+            end_frame(tele)
+
+        def counted_report( tele, output=print ):
+            report(tele, output)
+            check.reported = True
+
+        cls.__init__, cls.end_stage, cls.collect, cls.end_frame, cls.report = (
+            counted_init, counted_end_stage, counted_collect, counted_end_frame, counted_report)
+        try:
+            super().run()
+        finally:
+            cls.__init__, cls.end_stage, cls.collect, cls.end_frame, cls.report = saved
+            tracemalloc.stop()
+
+    def check_frame( self ):
+        now = self.clock.now_ms
+        if now >= WARMUP_MS:
+            self.checked += 1
+            for stage in range(len(self.stage_names)):
+                used = self.stage_alloc[stage]
+                name = self.stage_names[stage]
+                slack = self.slack
+                if slack is None:
+                    slack = CPYTHON_SLACK_BYTES.get(name, DEFAULT_SLACK_BYTES)
+                if used <= slack or stage in self.polled:
+                    continue
+                if name == CLOCK_STAGE and replay.FakeRTC.reads != self.rtc_reads:
+                    continue
+                if name == REPORT_STAGE and self.reported:
+                    continue
+                self.failures.append((now, name, used))
+        for stage in range(len(self.stage_alloc)):
+            self.stage_alloc[stage] = 0
+        self.polled.clear()
+        self.reported = False
+        self.rtc_reads = replay.FakeRTC.reads
+
+    def report( self ):
+        print(f"Simulated {self.clock.now_ms / 1000:.1f} s, checked {self.checked} frames")
+        if not self.failures:
+            print("No steady state allocations")
+            return
+        print(f"{len(self.failures)} stages allocated where they shouldn't:")
+        for now, name, used in self.failures[:20]:
+            print(f"  {now / 1000:.2f} s: {name} {used} bytes")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the clock's main loop doesn't allocate in steady state")
+    parser.add_argument("scenario", help="Scenario file (JSON lines, see recorder.py)")
+    parser.add_argument("--duration", type=float, default=300, help="Seconds of virtual time to run for")
+    parser.add_argument("--slack", type=int, help="Bytes every stage is allowed (instead of the CPython allowances)")
+    args = parser.parse_args()
+
+    check = AllocCheck(replay.load_scenario(args.scenario), int(args.duration * 1000), args.slack)
+    check.run()
+    check.report()
+    sys.exit(1 if check.failures else 0)
+
+if __name__ == "__main__":
+    main()
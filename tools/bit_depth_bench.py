@@ -0,0 +1,138 @@
+# Host-side benchmark of the clock's main loop at each matrix bit depth
+#
+# Runs main() on the tools/replay.py fakes once for each BIT_DEPTH, with the
+# real world map (the fake adafruit_imageload only gives a blank one), and
+# reports for each:
+#
+#   - frames per virtual second, from the loop's own waits. The virtual clock
+#     doesn't model the matrix driver, whose share of the CPU is what a lower
+#     bit depth saves, so that part only shows in the telemetry on the board
+#   - host ms per frame, the loop's own work (for comparing depths and changes)
+#   - what build_frames() cost at boot, and how many of the map's colors
+#     still come out as distinct shades (a pixel's colors over all the dither
+#     phases, whichever phase each one is in)
+#
+#   python tools/bit_depth_bench.py tools/scenarios/normal.jsonl --depths 3 4 5
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import replay # Also puts the clock's modules on the path
+
+WARMUP_MS = 10000 # Boot and the first poll of everything aren't timed
+
+def load_png565( path ):
+    """ An 8 bit RGB PNG (like /world_map.png) as an RGB565 bitmap, the way the clock loads it """
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 8 # After the signature
+    compressed = b""
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if kind == b"IHDR":
+            width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", body)
+            if (depth, color_type, interlace) != (8, 2, 0):
+                raise ValueError(f"{path} isn't an 8 bit RGB PNG")
+        elif kind == b"IDAT":
+            compressed += body
+        pos += 12 + length
+    raw = zlib.decompress(compressed)
+
+    bitmap = replay.FakeBitmap(width, height)
+    stride = width * 3
+    above = bytearray(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        kind = raw[start]
+        row = bytearray(raw[start + 1:start + 1 + stride])
+        for i in range(stride):
+            left = row[i - 3] if i >= 3 else 0
+            up = above[i]
+            up_left = above[i - 3] if i >= 3 else 0
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif kind == 4: # Paeth
+                p = left + up - up_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else up if pb <= pc else up_left)) & 0xFF
+        for x in range(width):
+            r, g, b = row[x * 3:x * 3 + 3]
+            bitmap[x, y] = ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+        above = row
+    return bitmap
+
+class BenchHarness(replay.Harness):
+    """ Runs the loop at one bit depth, timing it and build_frames() on the host """
+
+    def __init__( self, records, duration_ms, bit_depth, world_map ):
+        super().__init__(records, duration_ms)
+        self.settings["BIT_DEPTH"] = bit_depth
+        self.world_map = world_map
+        self.build_ms = 0
+        self.map_shades = 0
+        self.timed_frames = 0
+        self.timed_ms = 0       # Virtual
+        self.host_start = None  # perf_counter() when timing started
+        self.host_ms = 0
+
+    def install( self ):
+        super().install()
+        world_map = self.world_map
+        sys.modules["adafruit_imageload"].load = lambda path, **kwargs: (world_map, replay.FakePalette(0))
+        import colorpipe
+        build_frames = colorpipe.ColorPipeline.build_frames
+        bench = self
+        def timed_build_frames( pipeline, source ):
+            start = time.perf_counter()
+            frames = build_frames(pipeline, source)
+            bench.build_ms += (time.perf_counter() - start) * 1000
+            bench.map_shades = len({tuple(sorted(frame[x, y] for frame in frames))
+                                    for y in range(source.height) for x in range(source.width)})
+            return frames
+        colorpipe.ColorPipeline.build_frames = timed_build_frames
+
+    def frame( self ):
+        now = time.perf_counter()
+        if self.host_start is not None:
+            self.timed_frames += 1
+            self.host_ms = (now - self.host_start) * 1000
+            self.timed_ms = self.clock.now_ms + replay.FRAME_MS - WARMUP_MS
+        elif self.clock.now_ms >= WARMUP_MS:
+            self.host_start = now
+        super().frame()
+
+    def result( self ):
+        """ (frames per virtual second, host ms per frame) once warmed up """
+        if not self.timed_frames:
+            return 0, 0
+        return self.timed_frames * 1000 / self.timed_ms, self.host_ms / self.timed_frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the clock's main loop at each matrix bit depth")
+    parser.add_argument("scenario", help="Scenario file (JSON lines, see recorder.py)")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of virtual time for each depth")
+    parser.add_argument("--depths", type=int, nargs="+", default=[3, 4, 5], help="BIT_DEPTH values to run")
+    parser.add_argument("--map", default=os.path.join(replay.ROOT, "world_map.png"), help="The clock's world map")
+    args = parser.parse_args()
+
+    world_map = load_png565(args.map)
+    colors = len({world_map[x, y] for y in range(world_map.height) for x in range(world_map.width)})
+    print(f"The map has {colors} colors")
+    print(f"{'bit depth':>9} {'frames/s':>9} {'host ms/frame':>14} {'build_frames ms':>16} {'map shades':>11}")
+    for depth in args.depths:
+        bench = BenchHarness(replay.load_scenario(args.scenario), int(args.duration * 1000), depth, world_map)
+        bench.run()
+        fps, host_ms = bench.result()
+        print(f"{depth:>9} {fps:>9.1f} {host_ms:>14.3f} {bench.build_ms:>16.1f} {bench.map_shades:>11}")
+
+if __name__ == "__main__":
+    main()
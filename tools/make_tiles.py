@@ -0,0 +1,71 @@
+# Host-side tool that cuts the world map into the zoom tiles used by tiles.py
+#
+# Runs on a PC, not on the MatrixPortal. Zoom level z is the map scaled to a
+# (64 << z) pixel square and cut into tile_size square tiles, written as raw
+# little endian RGB565 so the clock can read them straight into a bitmap:
+#
+#   <out>/<zoom>/<tx>_<ty>.bin
+#
+#   pip install pillow
+#   python tools/make_tiles.py --out /Volumes/CIRCUITPY/sd/tiles
+#
+# The tiles are blitted straight to the display, so they're gamma corrected and
+# rounded to the matrix bit depth here, the same way the clock does its markers
+# (ColorPipeline.correct565 in colorpipe.py, with dim shades kept lit).
+#
+# Zoom 0 isn't written, the clock draws /world_map.png itself at that level.
+# The 64x64 map has no more detail to give, so for sharper zoom levels pass a
+# bigger Mercator map with --source.
+import argparse
+import os
+import struct
+import sys
+
+try:
+    from PIL import Image
+except ImportError:
+    raise SystemExit("make_tiles needs Pillow (pip install pillow)")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from colorpipe import ColorPipeline
+
+def to_rgb565(r, g, b):
+    """ 8 bit RGB -> RGB565, the way the clock loads its images """
+    return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut the world map into RGB565 zoom tiles")
+    parser.add_argument("--source", default=os.path.join(os.path.dirname(__file__), "..", "world_map_original.png"))
+    parser.add_argument("--out", default="tiles")
+    parser.add_argument("--max-zoom", type=int, default=3, help="MAX_ZOOM in code.py")
+    parser.add_argument("--tile-size", type=int, default=32, help="TILE_SIZE in code.py")
+    parser.add_argument("--gamma", type=float, default=2.2, help="GAMMA in code.py")
+    parser.add_argument("--bit-depth", type=int, default=4, help="BIT_DEPTH in code.py")
+    args = parser.parse_args()
+
+    pipeline = ColorPipeline(args.bit_depth, args.gamma)
+    source = Image.open(args.source).convert("RGB")
+    for zoom in range(1, args.max_zoom + 1):
+        size = 64 << zoom
+        # Nearest keeps the coastlines crisp when we're only upscaling the 64x64 map
+        resample = Image.NEAREST if source.width < size else Image.LANCZOS
+        image = source.resize((size, size), resample)
+        pixels = image.load()
+        folder = os.path.join(args.out, str(zoom))
+        os.makedirs(folder, exist_ok=True)
+
+        t = args.tile_size
+        count = 0
+        for ty in range(size // t):
+            for tx in range(size // t):
+                data = bytearray()
+                for y in range(ty * t, (ty + 1) * t):
+                    for x in range(tx * t, (tx + 1) * t):
+                        data += struct.pack("<H", pipeline.correct565(to_rgb565(*pixels[x, y])))
+                with open(os.path.join(folder, f"{tx}_{ty}.bin"), "wb") as f:
+                    f.write(data)
+                count += 1
+        print(f"Zoom {zoom}: {count} tiles of {t}x{t}")
+
+if __name__ == "__main__":
+    main()
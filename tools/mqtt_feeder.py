@@ -0,0 +1,70 @@
+# Host-side feeder for the clock's MQTT push mode (see push.py)
+#
+# Runs on a PC/Pi, not on the MatrixPortal. Polls open-notify for the ISS
+# position and publishes it, along with the time, to the broker the clocks are
+# subscribed to. Positions are retained so a clock gets the latest one as soon
+# as it (re)connects. The time isn't: a retained time would be up to an hour old
+# by the time a clock subscribed, and would set its clock back. Positions carry
+# the time they were sent, which the clock checks the time messages against, so
+# this computer's clock is the one that counts.
+#
+#   pip install paho-mqtt
+#   python tools/mqtt_feeder.py --broker mqtt.local
+import argparse
+import json
+import time
+import urllib.request
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    raise SystemExit("The feeder needs paho-mqtt (pip install paho-mqtt)")
+
+ISS_URL = "http://api.open-notify.org/iss-now.json"
+ISS_NORAD_ID = 25544
+
+def get_iss_position():
+    """ (lat, lon) from open-notify, or None if it failed """
+    try:
+        with urllib.request.urlopen(ISS_URL, timeout=5) as response:
+            data = json.load(response)
+        return float(data['iss_position']['latitude']), float(data['iss_position']['longitude'])
+    except Exception as e:
+        print(f"Error fetching ISS position: {e}")
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish ISS position and time for the clock's push mode")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--prefix", default="isstracker", help="Topic prefix (MQTT_TOPIC_PREFIX on the clock)")
+    parser.add_argument("--interval", type=float, default=10, help="Seconds between ISS updates")
+    parser.add_argument("--time-interval", type=float, default=3600, help="Seconds between time updates")
+    args = parser.parse_args()
+
+    client = mqtt.Client()
+    if args.username:
+        client.username_pw_set(args.username, args.password)
+    client.connect(args.broker, args.port)
+    client.loop_start()
+
+    last_time = 0
+    while True:
+        now = int(time.time())
+        if now - last_time >= args.time_interval:
+            offset = time.localtime(now).tm_gmtoff
+            client.publish(f"{args.prefix}/time", f"{now},{offset}")
+            last_time = now
+
+        position = get_iss_position()
+        if position is not None:
+            payload = f"{position[0]:.4f},{position[1]:.4f},{now}"
+            client.publish(f"{args.prefix}/position/{ISS_NORAD_ID}", payload, retain=True)
+            print(f"Published ISS {payload} ({len(payload)} bytes)")
+
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,585 @@
+# Host-side harness that runs the clock's main() loop against a recorded (or
+# hand written) network scenario - see recorder.py for the scenario format
+#
+# Runs on a PC, not on the MatrixPortal. The CircuitPython hardware modules are
+# replaced by just enough fakes to run the loop, adafruit_requests.Session and
+# wifi.radio are replaced by ReplaySession/ReplayRadio, and time runs on a
+# virtual clock: request latency, timeouts and time.sleep() all move the clock
+# forward instead of waiting, so a 15 minute scenario runs in a few seconds.
+#
+#   python tools/replay.py tools/scenarios/wifi_drop.jsonl --duration 900
+#
+# For push mode, scenarios can also have records for an MQTT broker (played by
+# ReplayBroker, with FakeMQTT standing in for adafruit_minimqtt):
+#
+#   {"t_ms": 0, "broker": "up"}                 (or "down" - connecting times out)
+#   {"t_ms": 10000, "topic": "isstracker/position/25544", "payload": "...",
+#    "latency_ms": 40, "retain": true}          (published at t_ms)
+#
+# Push mode is on when MQTT_BROKER is set, like on the clock:
+#
+#   MQTT_BROKER=test python tools/replay.py tools/scenarios/push.jsonl
+#
+# At the end it reports the longest gap between frames (render stall), the
+# request latency distribution and how long each endpoint took to recover
+# after it started failing, and for push mode the latency and size of each
+# update.
+import argparse
+import array
+import calendar
+import datetime
+import gc
+import importlib.util
+import json
+import os
+import sys
+import time
+import types
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from recorder import RecordedResponse
+
+START_UNIX = 1735732800 # 2025-01-01 12:00 UTC, the virtual clock starts here
+RTC_RESET_UNIX = 946684800 # 2000-01-01, where the board's RTC starts until something sets it
+TICKS_PERIOD = 1 << 29 # supervisor.ticks_ms() wraps around at this
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+BOARD_TICKS_START = 0x1fff0000 # Where ticks_ms() starts on the board, so it first wraps after about 65 s
+FRAME_MS = 20 # Virtual time each frame takes to draw/refresh
+NO_RECORD_STATUS = 404 # Status for URLs the scenario has nothing for
+
+class SimulationDone(Exception):
+    pass
+
+class VirtualClock:
+    """ Milliseconds since the start of the run, only moves when something takes time """
+    now_ms = 0
+    rtc_base = RTC_RESET_UNIX # What time.time() reads at the start of the run (moves when the RTC is set)
+    ticks_start = BOARD_TICKS_START # What ticks_ms() reads at the start of the run
+
+    def sleep( self, seconds ):
+        self.now_ms += int(seconds * 1000)
+
+    def ticks_ms( self ):
+        return (self.ticks_start + self.now_ms) % TICKS_PERIOD
+
+    def monotonic_ns( self ):
+        return self.now_ms * 1000000
+
+    def time( self ):
+        return self.rtc_base + self.now_ms // 1000
+
+    def set_time( self, secs ):
+        self.rtc_base = secs - self.now_ms // 1000
+
+    def localtime( self, secs=None ):
+        return time.gmtime(self.time() if secs is None else secs)
+
+# adafruit_ticks (the board has it compiled in lib/, so it can't be imported here)
+
+def ticks_add( ticks, delta ):
+    if -TICKS_HALFPERIOD < delta < TICKS_HALFPERIOD:
+        return (ticks + delta) % TICKS_PERIOD
+    raise OverflowError("ticks interval overflow")
+
+def ticks_diff( ticks1, ticks2 ):
+    diff = (ticks1 - ticks2) & TICKS_MAX
+    return ((diff + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+def ticks_less( ticks1, ticks2 ):
+    return ticks_diff(ticks1, ticks2) < 0
+
+def load_scenario( path ):
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                records.append(json.loads(line))
+    records.sort(key=lambda r: r["t_ms"])
+    return records
+
+def host_of( url ):
+    return url.split("/")[2] if "//" in url else url
+
+class ReplayRadio:
+    """ Stands in for wifi.radio, up or down according to the scenario's wifi records """
+    mac_address = b"\x02\x00\x00\x00\x00\x01"
+    connect_ms = 2000
+
+    def __init__( self, records, clock ):
+        self.clock = clock
+        self.events = [(r["t_ms"], r["wifi"] == "up") for r in records if "wifi" in r]
+        self.joined = False
+        self.connects = 0
+
+    def network_up( self ):
+        up = True
+        for t_ms, state in self.events:
+            if t_ms > self.clock.now_ms:
+                break
+            up = state
+        return up
+
+    @property
+    def ipv4_address( self ):
+        if self.joined and self.network_up():
+            return "192.168.1.50"
+        self.joined = False
+        return None
+
+    def connect( self, ssid, password ):
+        self.connects += 1
+        self.clock.now_ms += self.connect_ms
+        if not self.network_up():
+            raise ConnectionError("No network with that ssid")
+        self.joined = True
+
+class ReplaySession:
+    """ Stands in for adafruit_requests.Session, answering from the scenario """
+
+    def __init__( self, records, clock, radio ):
+        self.clock = clock
+        self.radio = radio
+        self.by_host = {}
+        for r in records:
+            if "url" in r:
+                self.by_host.setdefault(host_of(r["url"]), []).append(r)
+        self.log = [] # (host, start ms, latency ms, ok, body bytes)
+
+    def pick( self, host ):
+        """ The latest record for this host at the current time (or the first one) """
+        records = self.by_host.get(host)
+        if not records:
+            return None
+        chosen = records[0]
+        for r in records:
+            if r["t_ms"] > self.clock.now_ms:
+                break
+            chosen = r
+        return chosen
+
+    def request( self, method, url, timeout=None, **kwargs ):
+        host = host_of(url)
+        start = self.clock.now_ms
+        try:
+            if self.radio.ipv4_address is None:
+                self.clock.now_ms += 10
+                raise OSError("[Errno 113] EHOSTUNREACH")
+            record = self.pick(host)
+            if record is None:
+                self.clock.now_ms += 50
+                response = RecordedResponse(NO_RECORD_STATUS, "")
+            else:
+                latency = record.get("latency_ms", 0)
+                if timeout is not None and latency > timeout * 1000:
+                    self.clock.now_ms += int(timeout * 1000)
+                    raise OSError("[Errno 116] ETIMEDOUT")
+                self.clock.now_ms += latency
+                if "error" in record:
+                    raise OSError(record["error"])
+                response = RecordedResponse(record["status"], record.get("body", ""))
+        except OSError:
+            self.log.append((host, start, self.clock.now_ms - start, False, 0))
+            raise
+        self.log.append((host, start, self.clock.now_ms - start, response.status_code == 200,
+                         len(response.content)))
+        return response
+
+    def get( self, url, **kwargs ):
+        return self.request("GET", url, **kwargs)
+
+def topic_matches( subscription, topic ):
+    """ MQTT topic match (only the single level + wildcard, which is all push.py uses) """
+    sub_levels = subscription.split("/")
+    levels = topic.split("/")
+    if len(sub_levels) != len(levels):
+        return False
+    for sub_level, level in zip(sub_levels, levels):
+        if sub_level != "+" and sub_level != level:
+            return False
+    return True
+
+class ReplayBroker:
+    """ An MQTT broker that's up or down and publishes messages according to the scenario """
+
+    def __init__( self, records, clock, radio ):
+        self.clock = clock
+        self.radio = radio
+        self.events = [(r["t_ms"], r["broker"] == "up") for r in records if "broker" in r]
+        self.messages = [r for r in records if "topic" in r]
+        self.log = [] # (topic, published ms, delivered ms, bytes on the wire, retained)
+
+    def reachable( self ):
+        up = False
+        for t_ms, state in self.events:
+            if t_ms > self.clock.now_ms:
+                break
+            up = state
+        return up and self.radio.ipv4_address is not None
+
+    def retained( self, subscription ):
+        """ The latest retained message on each matching topic """
+        latest = {}
+        for r in self.messages:
+            if r["t_ms"] > self.clock.now_ms:
+                break
+            if r.get("retain") and topic_matches(subscription, r["topic"]):
+                latest[r["topic"]] = r
+        return list(latest.values())
+
+class FakeSocket:
+    def __init__( self, timeout ):
+        self.timeout = timeout
+
+    def settimeout( self, timeout ):
+        self.timeout = timeout
+
+class FakeMQTT:
+    """ Stands in for adafruit_minimqtt's MQTT client, talking to harness.broker """
+    connect_ms = 300
+
+    def __init__( self, broker=None, port=1883, socket_timeout=1, recv_timeout=10, **kwargs ):
+        # The same argument checks as MiniMQTT
+        if recv_timeout <= socket_timeout:
+            raise ValueError("recv_timeout must be strictly greater than socket_timeout")
+        self.broker = broker
+        self._socket_timeout = socket_timeout
+        self._sock = None
+        self.on_message = None
+        self.subscriptions = []
+        self.pending = []   # Retained messages due on the next loop()
+        self.next_message = 0 # Index of the first broker message we haven't seen
+        self.log_message = None
+        self.timed_out = None
+
+    def connect( self ):
+        replay = harness.broker
+        if not replay.reachable():
+            harness.clock.now_ms += int(self._socket_timeout * 1000)
+            raise OSError("[Errno 116] ETIMEDOUT")
+        harness.clock.now_ms += self.connect_ms
+        self._sock = FakeSocket(self._socket_timeout)
+        self.subscriptions = []
+        self.pending = []
+        self.next_message = 0
+        while (self.next_message < len(replay.messages)
+               and replay.messages[self.next_message]["t_ms"] <= harness.clock.now_ms):
+            self.next_message += 1
+
+    def subscribe( self, topic ):
+        if self._sock is None:
+            raise OSError("Not connected")
+        self.subscriptions.append(topic)
+        self.pending.extend(harness.broker.retained(topic))
+
+    def loop( self, timeout=1.0 ):
+        if timeout < self._socket_timeout:
+            raise ValueError(f"loop timeout ({timeout}) must be >= socket timeout ({self._socket_timeout}))")
+        if self._sock is None:
+            raise OSError("Not connected")
+        # Allocate what MiniMQTT's loop() does on every call, messages or not (its
+        # debug log string, the list of packet types and the read timing out), so
+        # tools/alloc_check.py sees a poll that isn't followed by a collect
+        self.log_message = f"waiting for messages for {timeout} seconds"
+        rcs = []
+        replay = harness.broker
+        clock = harness.clock
+        if not replay.reachable():
+            clock.now_ms += int(self._sock.timeout * 1000)
+            raise OSError("[Errno 104] ECONNRESET")
+        if not self.pending and not self.message_due(replay.messages, clock.now_ms):
+            # Nothing waiting, so the read blocks for the socket timeout
+            clock.now_ms += max(1, int(self._sock.timeout * 1000))
+            self.timed_out = OSError(116, "ETIMEDOUT")
+            return None
+        due = [(r, True) for r in self.pending]
+        self.pending = []
+        while self.next_message < len(replay.messages):
+            r = replay.messages[self.next_message]
+            if r["t_ms"] + r.get("latency_ms", 0) > clock.now_ms:
+                break
+            self.next_message += 1
+            if any(topic_matches(sub, r["topic"]) for sub in self.subscriptions):
+                due.append((r, False))
+        if not due:
+            clock.now_ms += max(1, int(self._sock.timeout * 1000))
+            self.timed_out = OSError(116, "ETIMEDOUT")
+            return None
+        for r, retained in due:
+            # Fixed header, remaining length, topic length, topic and payload (QoS 0)
+            size = 4 + len(r["topic"]) + len(r["payload"])
+            replay.log.append((r["topic"], r["t_ms"], clock.now_ms, size, retained))
+            self.on_message(self, r["topic"], r["payload"])
+            rcs.append(0x30)
+        return rcs
+
+    def message_due( self, messages, now_ms ):
+        """ True if the broker has published something we haven't looked at yet """
+        if self.next_message >= len(messages):
+            return False
+        r = messages[self.next_message]
+        return r["t_ms"] + r.get("latency_ms", 0) <= now_ms
+
+    def disconnect( self ):
+        self._sock = None
+
+################################################################################
+# Fake CircuitPython modules (just enough for code.py to run)
+
+class FakeBitmap:
+    def __init__( self, width, height, value_count=65535 ):
+        self.width = width
+        self.height = height
+        self.pixels = array.array("I", bytes(4 * width * height))
+        self.filled = None # An array of the last fill value, so fill() doesn't allocate
+
+    def __getitem__( self, xy ):
+        return self.pixels[xy[1] * self.width + xy[0]]
+
+    def __setitem__( self, xy, value ):
+        x, y = xy
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[y * self.width + x] = value
+
+    def fill( self, value ):
+        if self.filled is None or self.filled[0] != value:
+            self.filled = array.array("I", [value]) * (self.width * self.height)
+        self.pixels[:] = self.filled
+
+class FakePalette(list):
+    def __init__( self, count ):
+        super().__init__([0] * count)
+
+    def make_transparent( self, index ):
+        pass
+
+class FakeTileGrid:
+    def __init__( self, bitmap, **kwargs ):
+        self.x = 0
+        self.y = 0
+        self.hidden = False
+
+    def __setitem__( self, index, tile ):
+        pass
+
+class FakeGroup(list):
+    def __init__( self, **kwargs ):
+        super().__init__()
+
+class FakeLabel:
+    def __init__( self, font, text="", color=0 ):
+        self.text = text
+        self.x = 0
+        self.y = 0
+
+    @property
+    def width( self ):
+        return len(self.text) * 8
+
+class FakeDisplay:
+    """ framebufferio.FramebufferDisplay - refresh() is where frame timing is measured """
+    brightness = 1
+    root_group = None
+
+    def __init__( self, matrix, auto_refresh=False, rotation=0 ):
+        self.auto_refresh = auto_refresh
+
+    def refresh( self ):
+        harness.frame()
+
+class FakeRTC:
+    """ rtc.RTC - setting the time moves what time.time() reads, like on the board """
+    reads = 0 # How many times the time has been read (each read makes a struct_time)
+
+    @property
+    def datetime( self ):
+        FakeRTC.reads += 1
+        return harness.clock.localtime()
+
+    @datetime.setter
+    def datetime( self, value ):
+        secs = calendar.timegm(value)
+        harness.max_rtc_set_back = max(harness.max_rtc_set_back, harness.clock.time() - secs)
+        harness.clock.set_time(secs)
+
+class FakeDigitalInOut:
+    value = True # Buttons are pulled up (not pressed)
+
+    def __init__( self, pin ):
+        pass
+
+def fake_blit( dest, source, x, y, x1=0, y1=0, x2=None, y2=None, skip_source_index=None, **kwargs ):
+    pass
+
+def install_fakes( clock, radio, session ):
+    def module( name, **attrs ):
+        m = types.ModuleType(name)
+        m.__dict__.update(attrs)
+        sys.modules[name] = m
+        return m
+
+    board = module("board")
+    board.__getattr__ = lambda name: name
+    module("rgbmatrix", RGBMatrix=lambda **kwargs: None)
+    module("framebufferio", FramebufferDisplay=FakeDisplay)
+    module("digitalio", DigitalInOut=FakeDigitalInOut,
+           Direction=types.SimpleNamespace(INPUT=0, OUTPUT=1),
+           Pull=types.SimpleNamespace(UP=1, DOWN=2))
+    module("displayio", Bitmap=FakeBitmap, Palette=FakePalette, TileGrid=FakeTileGrid, Group=FakeGroup,
+           ColorConverter=lambda **kwargs: None, Colorspace=types.SimpleNamespace(RGB565=0),
+           release_displays=lambda: None)
+    module("bitmaptools", blit=fake_blit, draw_line=lambda *a: None, fill_region=lambda *a: None,
+           draw_circle=lambda *a: None, readinto=lambda *a, **k: None)
+    module("adafruit_imageload", load=lambda path, **kwargs: (FakeBitmap(64, 64), FakePalette(0)))
+    module("supervisor", ticks_ms=clock.ticks_ms)
+    module("adafruit_ticks", ticks_ms=clock.ticks_ms, ticks_add=ticks_add, ticks_diff=ticks_diff,
+           ticks_less=ticks_less)
+    module("rtc", RTC=FakeRTC)
+    module("adafruit_datetime", datetime=datetime.datetime)
+    module("adafruit_display_text", label=types.SimpleNamespace(Label=FakeLabel))
+    module("adafruit_bitmap_font", bitmap_font=types.SimpleNamespace(load_font=lambda path: None))
+    module("wifi", radio=radio)
+    module("socketpool", SocketPool=lambda radio: None)
+    module("adafruit_requests", Session=lambda pool, ssl_context: session)
+    minimqtt = module("adafruit_minimqtt")
+    minimqtt.adafruit_minimqtt = module("adafruit_minimqtt.adafruit_minimqtt", MQTT=FakeMQTT)
+
+    # The loop's timing all goes through these
+    time.sleep = clock.sleep
+    time.monotonic_ns = clock.monotonic_ns
+    time.time = clock.time
+    time.localtime = clock.localtime
+
+    # CircuitPython only
+    gc.mem_alloc = lambda: 0
+    gc.mem_free = lambda: 0
+
+################################################################################
+# Running and reporting
+
+class Harness:
+    def __init__( self, records, duration_ms ):
+        self.clock = VirtualClock()
+        self.radio = ReplayRadio(records, self.clock)
+        self.session = ReplaySession(records, self.clock, self.radio)
+        self.broker = ReplayBroker(records, self.clock, self.radio)
+        self.duration_ms = duration_ms
+        self.last_frame = None
+        self.frames = 0
+        self.longest_stall = 0
+        self.longest_stall_at = 0
+        self.max_rtc_set_back = 0 # Seconds the clock was ever set back by
+        self.verbose = False
+        self.settings = {} # code.py constants to change before main() runs (e.g. BIT_DEPTH)
+
+    def frame( self ):
+        self.clock.now_ms += FRAME_MS
+        now = self.clock.now_ms
+        if self.last_frame is not None:
+            gap = now - self.last_frame
+            if gap > self.longest_stall:
+                self.longest_stall = gap
+                self.longest_stall_at = self.last_frame
+        self.last_frame = now
+        self.frames += 1
+        if now >= self.duration_ms:
+            raise SimulationDone()
+
+    def install( self ):
+        install_fakes(self.clock, self.radio, self.session)
+
+    def run( self ):
+        global harness
+        harness = self
+        saved = (time.sleep, time.monotonic_ns, time.time, time.localtime)
+        imported = set(sys.modules)
+        self.install()
+        try:
+            spec = importlib.util.spec_from_file_location("clock_code", os.path.join(ROOT, "code.py"))
+            clock_code = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(clock_code)
+            clock_code.DEBUG = self.verbose
+            for name, value in self.settings.items():
+                setattr(clock_code, name, value)
+            clock_code.main()
+        except SimulationDone:
+            pass
+        finally:
+            time.sleep, time.monotonic_ns, time.time, time.localtime = saved
+            # Forget the clock's modules, so the next run imports them against its own fakes (like a reset)
+            root = os.path.abspath(ROOT)
+            for name in set(sys.modules) - imported:
+                path = getattr(sys.modules[name], "__file__", None)
+                if path and os.path.dirname(os.path.abspath(path)) == root:
+                    del sys.modules[name]
+
+    def recovery_times( self ):
+        """ For each host, ms from the first failure of each failing streak to the next success """
+        streaks = {}
+        recoveries = {}
+        for host, start, latency, ok, size in self.session.log:
+            if not ok:
+                streaks.setdefault(host, start)
+            elif host in streaks:
+                recoveries.setdefault(host, []).append(start + latency - streaks.pop(host))
+        return recoveries, streaks
+
+    def report( self ):
+        print(f"Simulated {self.clock.now_ms / 1000:.1f} s, {self.frames} frames, "
+              f"{self.radio.connects} WiFi connects")
+        print(f"Longest render stall: {self.longest_stall} ms (at {self.longest_stall_at / 1000:.1f} s)")
+
+        by_host = {}
+        for host, start, latency, ok, size in self.session.log:
+            by_host.setdefault(host, []).append((latency, ok, size))
+        print("Request latency (ms):")
+        for host, results in sorted(by_host.items()):
+            latencies = sorted(latency for latency, ok, size in results)
+            failed = sum(1 for latency, ok, size in results if not ok)
+            body = sum(size for latency, ok, size in results) // len(results)
+            print(f"  {host}: {len(results)} requests, {failed} failed, "
+                  f"p50 {percentile(latencies, 0.5)}, p90 {percentile(latencies, 0.9)}, "
+                  f"p99 {percentile(latencies, 0.99)}, max {latencies[-1]}, body bytes/request {body}")
+
+        if self.broker.log:
+            # Retained messages are as old as they are, so they're left out of the latency
+            latencies = sorted(delivered - published for topic, published, delivered, size, retained
+                               in self.broker.log if not retained)
+            size = sum(size for topic, published, delivered, size, retained in self.broker.log) // len(self.broker.log)
+            print(f"Push updates: {len(self.broker.log)} ({len(self.broker.log) - len(latencies)} retained), "
+                  f"bytes/update {size}, latency (ms) p50 {percentile(latencies, 0.5)}, "
+                  f"p90 {percentile(latencies, 0.9)}, max {latencies[-1]}")
+        if self.max_rtc_set_back > 0:
+            print(f"Clock was set back by up to {self.max_rtc_set_back} s")
+
+        recoveries, still_failing = self.recovery_times()
+        print("Recovery time (first failure to next success):")
+        if not recoveries and not still_failing:
+            print("  no failures")
+        for host, times in sorted(recoveries.items()):
+            print(f"  {host}: {len(times)} outages, longest {max(times) / 1000:.1f} s")
+        for host, start in sorted(still_failing.items()):
+            print(f"  {host}: still failing since {start / 1000:.1f} s")
+
+def percentile( values, p ):
+    """ p (0 to 1) percentile of a sorted list """
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the clock's main loop against a network scenario")
+    parser.add_argument("scenario", help="Scenario file (JSON lines, see recorder.py)")
+    parser.add_argument("--duration", type=float, default=900, help="Seconds of virtual time to run for")
+    parser.add_argument("--verbose", action="store_true", help="Show the clock's debug output")
+    args = parser.parse_args()
+
+    replay = Harness(load_scenario(args.scenario), int(args.duration * 1000))
+    replay.verbose = args.verbose
+    replay.run()
+    replay.report()
+
+harness = None
+
+if __name__ == "__main__":
+    main()